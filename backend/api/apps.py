@@ -1,6 +1,15 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
 
 
 class ApiConfig(AppConfig):
     name = 'api'
     verbose_name = 'Управление API'
+
+    def ready(self):
+        font_path = os.path.join(settings.BASE_DIR, 'data', 'List.ttf')
+        pdfmetrics.registerFont(TTFont('List', font_path))
@@ -0,0 +1,212 @@
+"""Асинхронные представления для запуска под ASGI.
+
+Подключаются вместо синхронных при ASYNC_VIEWS (по умолчанию включена
+в foodgram/asgi.py) для запросов, большую часть времени ждущих ввода-
+вывода: скачивание списка покупок, загрузка изображения рецепта, лента
+и автодополнение ингредиентов.
+"""
+
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from recipes.feed import aget_feed
+
+from .catalogue import ingredient_list_response
+from .pagination import FeedCursorPagination, get_limit
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from .search import ingredient_index
+from .serializers import RecipeSerializer
+from .shopping_list import TEXT_FORMATS, get_pdf, get_shopping_list_queryset
+from .views import FILENAME, RecipeViewSet, get_recipe_queryset
+
+
+def read_file(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+class AsyncAPIView(GenericAPIView):
+    """APIView с асинхронными обработчиками методов.
+
+    Аутентификация, проверка прав и ограничение частоты запросов DRF
+    выполняются в потоке, обработчик - в цикле событий. Методы без
+    асинхронного обработчика и OPTIONS передаются синхронному sync_view:
+    его метаданные описывают все методы адреса.
+    """
+
+    sync_view = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        handler = getattr(self, method, None)
+        if self.sync_view is not None and (
+            handler is None or method == 'options'
+        ):
+            return await sync_to_async(self.sync_view)(
+                request, *args, **kwargs
+            )
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if handler is None or method not in self.http_method_names:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+
+class ShoppingCartDownloadView(AsyncAPIView):
+    """Список покупок в формате pdf, txt или csv.
+
+    Строки читаются из БД целиком: Django 4.1 не передает потоком
+    ответы асинхронных представлений. pdf формируется вне цикла событий.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (
+        JSONRenderer,
+        PDFRenderer,
+        PlainTextRenderer,
+        CSVRenderer,
+    )
+
+    async def get(self, request):
+        rows = [
+            row async for row in get_shopping_list_queryset(request.user)
+        ]
+        file_format = request.accepted_renderer.format
+        if file_format not in TEXT_FORMATS:
+            file_format = 'pdf'
+        if file_format in TEXT_FORMATS:
+            formatter, content_type = TEXT_FORMATS[file_format]
+            response = HttpResponse(
+                ''.join(formatter(rows)), content_type=content_type
+            )
+        else:
+            path = await sync_to_async(get_pdf, thread_sensitive=False)(rows)
+            if path is None:
+                return Response(
+                    data={'detail': 'Список покупок формируется.'},
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={
+                        'Location': request.get_full_path(),
+                        'Retry-After': '1',
+                    },
+                )
+            response = HttpResponse(
+                await sync_to_async(read_file, thread_sensitive=False)(path),
+                content_type='application/pdf',
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{FILENAME}.{file_format}"'
+        )
+        return response
+
+
+class FeedView(AsyncAPIView):
+    """Новые рецепты авторов, на которых подписан пользователь."""
+
+    permission_classes = (IsAuthenticated,)
+    pagination_class = FeedCursorPagination
+
+    async def get(self, request):
+        queryset = await aget_feed(
+            request.user, get_recipe_queryset(request.user)
+        )
+        return await sync_to_async(self.get_page)(queryset)
+
+    def get_page(self, queryset):
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+
+class IngredientListView(AsyncAPIView):
+    """Список ингредиентов и поиск по имени из индекса в памяти."""
+
+    permission_classes = (AllowAny,)
+    renderer_classes = (JSONRenderer,)
+
+    async def get(self, request):
+        name = request.query_params.get('name')
+        limit = get_limit(request, 'limit')
+        if name:
+            return Response(await ingredient_index.asearch(name, limit))
+        if limit is not None:
+            return Response(await ingredient_index.aall(limit))
+        return await ingredient_list_response.arespond(request)
+
+
+class RecipeWriteView(AsyncAPIView):
+    """Запись рецепта действием RecipeViewSet.
+
+    Тело запроса с изображением в base64 принимает сервер ASGI без
+    участия потоков; разбор тела, декодирование изображения и запись
+    в хранилище выполняет RecipeViewSet в потоке.
+    """
+
+    permission_classes = RecipeViewSet.permission_classes
+
+    async def run_action(self, request, action, **kwargs):
+        viewset = RecipeViewSet(
+            action=action,
+            request=request,
+            args=self.args,
+            kwargs=self.kwargs,
+            format_kwarg=self.format_kwarg,
+            headers=self.headers,
+        )
+        return await sync_to_async(getattr(viewset, action))(
+            request, **kwargs
+        )
+
+
+class RecipeListView(RecipeWriteView):
+    """Создание рецепта; список отдает RecipeViewSet."""
+
+    sync_view = staticmethod(
+        RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+    )
+
+    async def post(self, request):
+        return await self.run_action(request, 'create')
+
+
+class RecipeDetailView(RecipeWriteView):
+    """Изменение рецепта; чтение и удаление выполняет RecipeViewSet."""
+
+    sync_view = staticmethod(
+        RecipeViewSet.as_view(
+            {
+                'get': 'retrieve',
+                'put': 'update',
+                'patch': 'partial_update',
+                'delete': 'destroy',
+            }
+        )
+    )
+
+    async def put(self, request, pk):
+        return await self.run_action(request, 'update', pk=pk)
+
+    async def patch(self, request, pk):
+        return await self.run_action(request, 'partial_update', pk=pk)
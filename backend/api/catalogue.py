@@ -0,0 +1,68 @@
+"""Готовый ответ с полным списком ингредиентов."""
+
+import gzip
+import hashlib
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from recipes.catalogue import CatalogueCache
+from recipes.models import Ingredient
+
+from .serializers import IngredientSerializer
+
+
+def accepts_gzip(accept_encoding):
+    """Принимает ли клиент gzip с учетом q-значений Accept-Encoding."""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = item.strip().lower().split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+class IngredientListResponse(CatalogueCache):
+    """Список ингредиентов, сериализованный и сжатый один раз на версию.
+
+    Хранит тело ответа без сжатия и в gzip вместе со строгим ETag;
+    ETag ответа в gzip отличается суффиксом -gz.
+    """
+
+    def build(self):
+        content = JSONRenderer().render(
+            IngredientSerializer(Ingredient.objects.all(), many=True).data
+        )
+        etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+        return etag, content, gzip.compress(content)
+
+    def respond(self, request):
+        return self.make_response(request, *self.get())
+
+    async def arespond(self, request):
+        return self.make_response(request, *await self.aget())
+
+    def make_response(self, request, etag, content, compressed):
+        # У сжатого и несжатого представлений разные строгие ETag
+        if accepts_gzip(request.headers.get('Accept-Encoding', '')):
+            etag = f'{etag[:-1]}-gz"'
+            response = HttpResponse(
+                compressed, content_type='application/json'
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return get_conditional_response(request, etag=etag, response=response)
+
+
+ingredient_list_response = IngredientListResponse()
@@ -0,0 +1,94 @@
+import base64
+import binascii
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+
+class PrimaryKeyListField(serializers.ListField):
+    """Список первичных ключей, проверяемый одним запросом id__in.
+
+    Возвращает объекты queryset в порядке переданных id без повторов,
+    а в ошибке перечисляет сразу все несуществующие id.
+    """
+
+    default_error_messages = {
+        'does_not_exist': 'Объекты с id {ids} не существуют!',
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        kwargs.setdefault('child', serializers.IntegerField(min_value=1))
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = list(dict.fromkeys(super().to_internal_value(data)))
+        objects = self.queryset.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            self.fail('does_not_exist', ids=', '.join(map(str, missing)))
+        return [objects[pk] for pk in ids]
+
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        return [item.pk for item in data]
+
+
+class SpooledBase64ImageField(Base64ImageField):
+    """Изображение в base64, декодируемое по частям во временный файл.
+
+    В отличие от Base64ImageField не держит в памяти декодированную копию
+    большого изображения: файл уходит на диск по достижении
+    FILE_UPLOAD_MAX_MEMORY_SIZE.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def get_chunks(self, base64_data):
+        """Части строки без пробельных символов длиной кратной 4.
+
+        Каждая часть декодируется отдельно; остаток некратной длины
+        переносится в следующую, последний остаток - как есть.
+        """
+        tail = ''
+        for start in range(0, len(base64_data), self.CHUNK_SIZE):
+            chunk = tail + ''.join(
+                base64_data[start:start + self.CHUNK_SIZE].split()
+            )
+            size = len(chunk) - len(chunk) % 4
+            tail = chunk[size:]
+            yield chunk[:size]
+        if tail:
+            yield tail
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        base64_data = base64_data.rpartition(';base64,')[2]
+        upload = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            for chunk in self.get_chunks(base64_data):
+                upload.write(base64.b64decode(chunk, validate=True))
+            upload.seek(0)
+            with Image.open(upload) as image:
+                extension = (image.format or '').lower()
+                image.verify()
+        except (binascii.Error, ValueError, OSError, SyntaxError):
+            upload.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            upload.close()
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        upload.seek(0)
+        return File(upload, name=f'{uuid.uuid4()}.{extension}')
@@ -0,0 +1,144 @@
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.models import Recipe
+from recipes.signals import change_counters
+from users.models import User
+
+from .serializers import RecipeIdsSerializer
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+
+
+class BulkRecipeSetMixin:
+    """Массовые операции над набором рецептов пользователя.
+
+    POST добавляет рецепты из ``ids``, DELETE удаляет их (без ``ids``
+    очищает набор целиком), PUT заменяет набор. Каждая операция проверяет
+    id одним запросом и меняет строки одним INSERT или DELETE.
+
+    Операции одного пользователя выполняются по очереди под блокировкой
+    его строки: иначе повторная отправка запроса посчитала бы одни и те
+    же рецепты добавленными дважды в счетчиках и суммах корзины.
+    """
+
+    set_model = None
+    counter_field = None
+
+    def get_bulk_ids(self, request, required=True):
+        if not required and 'ids' not in request.data:
+            return None
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['ids']))
+
+    def get_user_set(self, user):
+        return self.set_model.objects.filter(user=user)
+
+    def lock_user(self, user):
+        """Блокирует строку пользователя до конца транзакции.
+
+        Берется и массовыми операциями, и добавлением или удалением
+        одного рецепта.
+        """
+        list(
+            User.objects.select_for_update()
+            .filter(pk=user.pk)
+            .values_list('pk', flat=True)
+        )
+
+    def after_add(self, user, recipe_ids):
+        """Вызывается после добавления рецептов в набор."""
+
+    def before_remove(self, user, recipe_ids, clear):
+        """Вызывается перед удалением рецептов (clear - очистка набора)."""
+
+    def add_recipes(self, user, recipe_ids):
+        self.set_model.objects.bulk_create(
+            [
+                self.set_model(user=user, recipe_id=recipe_id)
+                for recipe_id in recipe_ids
+            ],
+            ignore_conflicts=True,
+        )
+        change_counters(Recipe, recipe_ids, self.counter_field, 1)
+        self.after_add(user, recipe_ids)
+
+    def remove_recipes(self, user, recipe_ids=None):
+        if recipe_ids is not None and not recipe_ids:
+            return []
+        user_set = self.get_user_set(user)
+        if recipe_ids is not None:
+            user_set = user_set.filter(recipe__in=recipe_ids)
+        removed = list(user_set.values_list('recipe', flat=True))
+        self.before_remove(user, removed, clear=recipe_ids is None)
+        # Один DELETE без сигналов post_delete: счетчики рецептов
+        # уменьшаются одним UPDATE ниже
+        user_set._raw_delete(user_set.db)
+        change_counters(Recipe, removed, self.counter_field, -1)
+        return removed
+
+    def get_results(self, ids, statuses):
+        return Response(
+            {
+                'results': [
+                    {'id': recipe_id, 'status': statuses[recipe_id]}
+                    for recipe_id in ids
+                ]
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @transaction.atomic
+    def bulk_add(self, request, *args, **kwargs):
+        ids = self.get_bulk_ids(request)
+        self.lock_user(request.user)
+        found = set(
+            Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        existing = set(
+            self.get_user_set(request.user)
+            .filter(recipe__in=found)
+            .values_list('recipe', flat=True)
+        )
+        added = [pk for pk in ids if pk in found and pk not in existing]
+        self.add_recipes(request.user, added)
+        statuses = dict.fromkeys(ids, NOT_FOUND)
+        statuses.update(dict.fromkeys(existing, EXISTS))
+        statuses.update(dict.fromkeys(added, ADDED))
+        return self.get_results(ids, statuses)
+
+    @transaction.atomic
+    def bulk_remove(self, request, *args, **kwargs):
+        ids = self.get_bulk_ids(request, required=False)
+        self.lock_user(request.user)
+        removed = self.remove_recipes(request.user, ids)
+        if ids is None:
+            ids = removed
+        statuses = dict.fromkeys(ids, MISSING)
+        statuses.update(dict.fromkeys(removed, REMOVED))
+        return self.get_results(ids, statuses)
+
+    @transaction.atomic
+    def bulk_replace(self, request, *args, **kwargs):
+        ids = self.get_bulk_ids(request)
+        self.lock_user(request.user)
+        found = set(
+            Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        existing = set(
+            self.get_user_set(request.user).values_list('recipe', flat=True)
+        )
+        removed = self.remove_recipes(request.user, existing - set(ids))
+        added = [pk for pk in ids if pk in found and pk not in existing]
+        self.add_recipes(request.user, added)
+        statuses = dict.fromkeys(ids, NOT_FOUND)
+        statuses.update(dict.fromkeys(existing & found, EXISTS))
+        statuses.update(dict.fromkeys(added, ADDED))
+        statuses.update(dict.fromkeys(removed, REMOVED))
+        return self.get_results(list(dict.fromkeys(ids + removed)), statuses)
@@ -1,4 +1,25 @@
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def get_limit(request, param):
+    """Неотрицательное целое значение параметра или None, если он не задан."""
+    try:
+        limit = int(request.query_params[param])
+    except (KeyError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
+def get_recipes_limit(request):
+    """Число рецептов автора в подписках из параметра recipes_limit.
+
+    Без параметра и сверх SUBSCRIPTION_RECIPES_LIMIT берется этот предел.
+    """
+    limit = get_limit(request, 'recipes_limit')
+    if limit is None:
+        return settings.SUBSCRIPTION_RECIPES_LIMIT
+    return min(limit, settings.SUBSCRIPTION_RECIPES_LIMIT)
 
 
 class LimitPageNumberPagination(PageNumberPagination):
@@ -7,3 +28,63 @@ class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
     page_query_param = 'page'
+
+
+class LimitCursorPagination(CursorPagination):
+    """Курсорный пагинатор по (-pub_date, -id) без COUNT(*) и OFFSET."""
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+
+class SubscriptionCursorPagination(LimitCursorPagination):
+    """Курсорный пагинатор подписок по дате подписки."""
+
+    ordering = ('-subscribed_at', '-id')
+
+
+class FeedCursorPagination(LimitCursorPagination):
+    """Курсорный пагинатор ленты подписок."""
+
+    ordering = ('-feed_date', '-id')
+
+
+class OptionalCursorPagination(LimitPageNumberPagination):
+    """Постраничный пагинатор с курсорным режимом по запросу.
+
+    Курсорный режим включается параметром ``?paginate=cursor``, дальнейшие
+    страницы запрашиваются по ссылкам ``next``/``previous`` с ``cursor``.
+    """
+
+    cursor_pagination_class = LimitCursorPagination
+    mode_query_param = 'paginate'
+    cursor_mode = 'cursor'
+
+    def is_cursor_mode(self, request):
+        return (
+            request.query_params.get(self.mode_query_param)
+            == self.cursor_mode
+            or self.cursor_pagination_class.cursor_query_param
+            in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.is_cursor_mode(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class SubscriptionPagination(OptionalCursorPagination):
+    """Пагинатор подписок с курсорным режимом по запросу."""
+
+    cursor_pagination_class = SubscriptionCursorPagination
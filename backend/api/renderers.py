@@ -0,0 +1,31 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Текстовый формат; используется в основном для сообщений об ошибках.
+
+    Сами файлы списка покупок отдаются потоковыми ответами в обход рендера.
+    """
+
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    """Формат csv."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(PlainTextRenderer):
+    """Формат pdf."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
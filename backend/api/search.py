@@ -0,0 +1,86 @@
+"""Поисковый индекс ингредиентов в памяти процесса."""
+
+from bisect import bisect_left
+from collections import defaultdict
+
+from recipes.catalogue import CatalogueCache
+from recipes.models import Ingredient
+
+TRIGRAM_SIZE = 3
+
+
+def get_trigrams(value):
+    return {
+        value[index:index + TRIGRAM_SIZE]
+        for index in range(len(value) - TRIGRAM_SIZE + 1)
+    }
+
+
+class IngredientIndex(CatalogueCache):
+    """Индекс ингредиентов для автодополнения без обращения к БД.
+
+    Хранит отсортированный по названию массив для поиска по префиксу и
+    триграммный индекс для поиска по подстроке. Перестраивается при
+    изменении версии справочника ингредиентов.
+    """
+
+    def build(self):
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].lower(), row['id']),
+        )
+        keys = [row['name'].lower() for row in rows]
+        trigrams = defaultdict(list)
+        for position, key in enumerate(keys):
+            for trigram in get_trigrams(key):
+                trigrams[trigram].append(position)
+        return rows, keys, dict(trigrams)
+
+    def search(self, value, limit=None):
+        """Ингредиенты, начинающиеся с value, затем содержащие value.
+
+        Внутри каждой группы результаты упорядочены по алфавиту.
+        """
+        return self.find(self.get(), value, limit)
+
+    async def asearch(self, value, limit=None):
+        return self.find(await self.aget(), value, limit)
+
+    def find(self, index, value, limit):
+        rows, keys, trigrams = index
+        value = value.lower()
+        prefix = []
+        position = bisect_left(keys, value)
+        while position < len(keys) and keys[position].startswith(value):
+            prefix.append(position)
+            position += 1
+        positions = prefix[:limit]
+        if limit is None or len(positions) < limit:
+            found = set(prefix)
+            positions += [
+                position
+                for position in self.get_candidates(value, keys, trigrams)
+                if position not in found and value in keys[position]
+            ][:None if limit is None else limit - len(positions)]
+        return [rows[position] for position in positions]
+
+    def get_candidates(self, value, keys, trigrams):
+        if len(value) < TRIGRAM_SIZE:
+            return range(len(keys))
+        postings = sorted(
+            (trigrams.get(trigram, []) for trigram in get_trigrams(value)),
+            key=len,
+        )
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+        return sorted(candidates)
+
+    def all(self, limit=None):
+        return self.get()[0][:limit]
+
+    async def aall(self, limit=None):
+        return (await self.aget())[0][:limit]
+
+
+ingredient_index = IngredientIndex()
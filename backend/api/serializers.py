@@ -1,12 +1,20 @@
+from django.core.files.storage import default_storage
 from django.db import transaction
 from django.forms import ValidationError
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from recipes.cart import add_to_totals, remove_from_totals
+from recipes.feed import fan_out_recipe
+from recipes.images import schedule_renditions
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
                             ShoppingCart, Subscription, Tag, TagRecipe)
+from recipes.storage import release_image
 from users.models import User
 
+from .fields import PrimaryKeyListField, SpooledBase64ImageField
+from .pagination import get_recipes_limit
+
 
 class SubscriptionsSerializer(serializers.ModelSerializer):
     """Сериализатор для подписок."""
@@ -35,6 +43,8 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
         return data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (
             request.user.is_authenticated
@@ -44,11 +54,16 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes(self, obj):
-        queryset = Recipe.objects.filter(author=obj)
+        if hasattr(obj, 'latest_recipes'):
+            queryset = obj.latest_recipes
+        else:
+            queryset = Recipe.objects.filter(author=obj)[
+                :get_recipes_limit(self.context['request'])
+            ]
         return RecipeMinifieldSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return obj.recipes_count
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -79,6 +94,8 @@ class UserSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Subscription.objects.filter(
             user=request.user, author=obj
         ).exists()
@@ -108,6 +125,14 @@ class PasswordSerializer(serializers.Serializer):
         return data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для массовых операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=True
+    )
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов."""
 
@@ -145,7 +170,7 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 class AddToIngredientInRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для добавления количества ингредиентов."""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(min_value=1)
     amount = serializers.IntegerField(write_only=True)
 
     class Meta:
@@ -153,18 +178,52 @@ class AddToIngredientInRecipeSerializer(serializers.ModelSerializer):
         model = IngredientInRecipe
 
 
-class RecipeMinifieldSerializer(serializers.ModelSerializer):
+class RecipeImageMixin(serializers.Serializer):
+    """Ссылки на уменьшенные копии изображения рецепта."""
+
+    thumbnail = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
+    def get_image_url(self, path):
+        url = default_storage.url(path)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_thumbnail(self, obj):
+        """Самая маленькая копия в jpeg или исходное изображение."""
+        if not obj.image_renditions:
+            return self.get_image_url(obj.image.name) if obj.image else None
+        smallest = min(obj.image_renditions, key=int)
+        return self.get_image_url(obj.image_renditions[smallest]['jpeg'])
+
+    def get_srcset(self, obj):
+        """Значения атрибута srcset для каждого формата копий."""
+        srcset = {}
+        for width, files in sorted(
+            obj.image_renditions.items(), key=lambda item: int(item[0])
+        ):
+            for file_format, path in files.items():
+                srcset.setdefault(file_format, []).append(
+                    f'{self.get_image_url(path)} {width}w'
+                )
+        return {
+            file_format: ', '.join(items)
+            for file_format, items in srcset.items()
+        }
+
+
+class RecipeMinifieldSerializer(RecipeImageMixin, serializers.ModelSerializer):
     """Сериализатор для упрощенного отображения модели рецептов."""
 
     image = Base64ImageField()
 
     class Meta:
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnail', 'srcset', 'cooking_time')
         read_only_fields = ('author',)
         model = Recipe
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(RecipeImageMixin, serializers.ModelSerializer):
     """Сериализатор для рецептов."""
 
     author = UserSerializer(default=serializers.CurrentUserDefault())
@@ -185,6 +244,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'thumbnail',
+            'srcset',
             'text',
             'cooking_time',
         )
@@ -194,12 +255,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         request = self.context['request']
         if request is None or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return Favorite.objects.filter(user=request.user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return ShoppingCart.objects.filter(
             user=request.user, recipe=obj
         ).exists()
@@ -209,13 +274,11 @@ class RecipePostSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецептов."""
 
     author = UserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = PrimaryKeyListField(queryset=Tag.objects.all())
     ingredients = AddToIngredientInRecipeSerializer(
         source='recipesingredients', many=True
     )
-    image = Base64ImageField(max_length=None, use_url=True)
+    image = SpooledBase64ImageField(max_length=None, use_url=True)
 
     class Meta:
         fields = (
@@ -231,7 +294,6 @@ class RecipePostSerializer(serializers.ModelSerializer):
         model = Recipe
 
     def validate_ingredients(self, ingredients):
-        print(ingredients)
         if not ingredients:
             raise serializers.ValidationError(
                 'Необходимо выбрать ингредиенты!'
@@ -247,40 +309,111 @@ class RecipePostSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Данный ингредиент уже есть в рецепте!'
             )
+        objects = Ingredient.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты с id {", ".join(map(str, missing))} '
+                f'не существуют!'
+            )
+        for ingredient in ingredients:
+            ingredient['id'] = objects[ingredient['id']]
         return ingredients
 
-    def add_ingredients_and_tags(self, tags, ingredients, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
-            recipe.save()
-        instances = [
-            IngredientInRecipe(
-                recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount'],
+    def update_tags(self, recipe, tags):
+        """Приводит теги рецепта к tags одной вставкой и одним удалением."""
+        existing = set(
+            TagRecipe.objects.filter(recipe=recipe).values_list(
+                'tag', flat=True
             )
+        )
+        new = {tag.id for tag in tags}
+        TagRecipe.objects.bulk_create(
+            [
+                TagRecipe(recipe=recipe, tag_id=tag_id)
+                for tag_id in new - existing
+            ]
+        )
+        if existing - new:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag__in=existing - new
+            ).delete()
+
+    def update_ingredients(self, recipe, ingredients):
+        """Приводит ингредиенты рецепта к ingredients.
+
+        Изменения вносятся не более чем одной вставкой, одним bulk_update
+        и одним удалением; суммы корзин с рецептом пересчитываются, только
+        если состав изменился.
+        """
+        existing = {
+            item.ingredient_id: item
+            for item in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        new = {
+            ingredient['id'].id: ingredient['amount']
             for ingredient in ingredients
+        }
+        created = [
+            IngredientInRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in existing
         ]
-        IngredientInRecipe.objects.bulk_create(instances)
-        return recipe
+        updated = []
+        for ingredient_id, item in existing.items():
+            if ingredient_id in new and item.amount != new[ingredient_id]:
+                item.amount = new[ingredient_id]
+                updated.append(item)
+        deleted = existing.keys() - new.keys()
+        if not (created or updated or deleted):
+            return
+        remove_from_totals([recipe.pk])
+        IngredientInRecipe.objects.bulk_create(created)
+        if updated:
+            IngredientInRecipe.objects.bulk_update(updated, ['amount'])
+        if deleted:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient__in=deleted
+            ).delete()
+        add_to_totals([recipe.pk])
 
     @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipesingredients')
         recipe = Recipe.objects.create(**validated_data)
-        recipe = self.add_ingredients_and_tags(
-            tags=tags, ingredients=ingredients, recipe=recipe
+        schedule_renditions(recipe)
+        TagRecipe.objects.bulk_create(
+            [TagRecipe(recipe=recipe, tag=tag) for tag in tags]
+        )
+        IngredientInRecipe.objects.bulk_create(
+            [
+                IngredientInRecipe(
+                    recipe=recipe,
+                    ingredient=ingredient['id'],
+                    amount=ingredient['amount'],
+                )
+                for ingredient in ingredients
+            ]
         )
+        fan_out_recipe(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('recipesingredients')
-        TagRecipe.objects.filter(recipe=instance).delete()
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-        instance = self.add_ingredients_and_tags(tags, ingredients, instance)
-        super().update(instance, validated_data)
-        instance.save()
-        return instance
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('recipesingredients', None)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if 'image' in validated_data:
+            old_image = instance.image.name
+            old_renditions = instance.image_renditions
+            schedule_renditions(instance)
+            transaction.on_commit(
+                lambda: release_image(old_image, old_renditions)
+            )
+        return super().update(instance, validated_data)
@@ -0,0 +1,238 @@
+"""Формирование списка покупок в pdf с кэшем по содержимому корзины."""
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from reportlab.pdfgen import canvas
+from rest_framework.exceptions import APIException
+
+from foodgram.metrics import record_cache
+from recipes.models import CartIngredientTotal
+
+logger = logging.getLogger(__name__)
+
+RENDERER_VERSION = 1
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.SHOPPING_LIST_WORKERS,
+    thread_name_prefix='shopping-list',
+)
+
+
+class RenderFailed(APIException):
+    """Фоновое формирование pdf завершилось ошибкой."""
+
+    default_detail = (
+        'Не удалось сформировать список покупок, повторите запрос.'
+    )
+    default_code = 'render_failed'
+
+
+def get_shopping_list_queryset(user):
+    """Суммарное количество каждого ингредиента в корзине пользователя."""
+    return (
+        CartIngredientTotal.objects.filter(user=user)
+        .values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+        .order_by('ingredient__name')
+    )
+
+
+def get_shopping_list(user):
+    return list(get_shopping_list_queryset(user))
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def format_text(rows):
+    """Строки текстового списка покупок по мере перебора rows."""
+    index = 0
+    for index, (name, measurement_unit, amount) in enumerate(rows, start=1):
+        if index == 1:
+            yield 'Cписок покупок:\n'
+        yield f'{index}. {name} - {amount} {measurement_unit}.\n'
+    if not index:
+        yield 'Cписок покупок пуст!\n'
+
+
+def format_csv(rows):
+    """Строки списка покупок в csv по мере перебора rows."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for name, measurement_unit, amount in rows:
+        yield writer.writerow((name, amount, measurement_unit))
+
+
+TEXT_FORMATS = {
+    'txt': (format_text, 'text/plain; charset=utf-8'),
+    'csv': (format_csv, 'text/csv; charset=utf-8'),
+}
+
+
+def get_cache_key(rows):
+    content = json.dumps([RENDERER_VERSION, rows], ensure_ascii=False)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def get_cache_path(key):
+    return os.path.join(settings.SHOPPING_LIST_CACHE_DIR, f'{key}.pdf')
+
+
+def render_pdf(rows, output):
+    """Записывает pdf-документ со списком покупок в файл output.
+
+    Шрифт List регистрируется один раз при старте приложения api.
+    """
+    page = canvas.Canvas(output)
+    x_position, y_position = 50, 800
+    if not rows:
+        page.setFont('List', 24)
+        page.drawString(x_position, y_position, 'Cписок покупок пуст!')
+        page.save()
+        return
+    page.setFont('List', 14)
+    indent = 20
+    page.drawString(x_position, y_position, 'Cписок покупок:')
+    for index, (name, measurement_unit, amount) in enumerate(rows, start=1):
+        page.drawString(
+            x_position,
+            y_position - indent,
+            f'{index}. {name} - {amount} {measurement_unit}.',
+        )
+        y_position -= 15
+        if y_position <= 50:
+            page.showPage()
+            page.setFont('List', 14)
+            y_position = 800
+    page.save()
+
+
+def prune_cache(keep):
+    """Удаляет файлы кэша старше SHOPPING_LIST_CACHE_MAX_AGE.
+
+    Если оставшиеся pdf больше SHOPPING_LIST_CACHE_MAX_SIZE, удаляются
+    давно не запрошенные: при попадании в кэш время файла обновляется.
+    Недописанные временные файлы удаляются только по возрасту, только
+    что записанный файл keep остается.
+    """
+    deadline = time.time() - settings.SHOPPING_LIST_CACHE_MAX_AGE
+    files = []
+    with os.scandir(settings.SHOPPING_LIST_CACHE_DIR) as entries:
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            size = stat.st_size if entry.name.endswith('.pdf') else 0
+            files.append((stat.st_mtime, size, entry.path))
+    files.sort(reverse=True)
+    total_size = 0
+    for modified, size, path in files:
+        total_size += size
+        if path == keep:
+            continue
+        if modified < deadline or (
+            size and total_size > settings.SHOPPING_LIST_CACHE_MAX_SIZE
+        ):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def render_to_cache(rows, key):
+    """Сохраняет pdf в кэш атомарной заменой файла."""
+    os.makedirs(settings.SHOPPING_LIST_CACHE_DIR, exist_ok=True)
+    path = get_cache_path(key)
+    descriptor, temp_path = tempfile.mkstemp(
+        dir=settings.SHOPPING_LIST_CACHE_DIR, suffix='.tmp'
+    )
+    try:
+        with os.fdopen(descriptor, 'wb') as temp_file:
+            render_pdf(rows, temp_file)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    prune_cache(path)
+
+
+def get_pending_key(key):
+    return f'shopping_list:pending:{key}'
+
+
+def get_failed_key(key):
+    return f'shopping_list:failed:{key}'
+
+
+def _render_in_background(rows, key):
+    try:
+        render_to_cache(rows, key)
+    except Exception:
+        logger.exception('Не удалось сформировать список покупок %s', key)
+        cache.set(
+            get_failed_key(key),
+            True,
+            timeout=settings.SHOPPING_LIST_RENDER_TIMEOUT,
+        )
+    finally:
+        cache.delete(get_pending_key(key))
+
+
+def get_shopping_list_pdf(user):
+    """Путь к готовому pdf или None, если он еще формируется в фоне."""
+    return get_pdf(get_shopping_list(user))
+
+
+def touch(path):
+    """Обновляет время файла кэша; False, если его уже нет."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def get_pdf(rows):
+    """Путь к pdf со строками rows или None, если он формируется в фоне.
+
+    Небольшие списки формируются сразу, большие передаются фоновому
+    потоку; одинаковые корзины используют один файл из кэша. Отметки
+    о формировании и ошибке хранятся в кэше Django, общем для процессов
+    сервера: повторный запрос в другой процесс не запускает формирование
+    второй раз. Об ошибке фонового формирования сообщает RenderFailed,
+    следующий запрос начинает его заново.
+    """
+    key = get_cache_key(rows)
+    path = get_cache_path(key)
+    exists = touch(path)
+    record_cache('shopping_list_pdf', exists)
+    if exists:
+        return path
+    if len(rows) <= settings.SHOPPING_LIST_SYNC_MAX_ROWS:
+        render_to_cache(rows, key)
+        return path
+    if cache.delete(get_failed_key(key)):
+        raise RenderFailed
+    # Отметка истекает, если процесс завершился, не сформировав файл
+    if cache.add(
+        get_pending_key(key),
+        True,
+        timeout=settings.SHOPPING_LIST_RENDER_TIMEOUT,
+    ):
+        executor.submit(_render_in_background, rows, key)
+    return None
@@ -0,0 +1,368 @@
+import base64
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient, APITestCase
+
+from recipes.cart import get_cart_amounts
+from recipes.models import (CartIngredientTotal, Ingredient,
+                            IngredientInRecipe, Recipe, Tag)
+from users.models import User
+
+from . import shopping_list
+from .serializers import RecipePostSerializer
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 2)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeWriteQueriesTest(TestCase):
+    """Число запросов записи рецепта не зависит от его состава."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Автор',
+            last_name='Рецептов',
+        )
+        cls.tags = Tag.objects.bulk_create(
+            [
+                Tag(
+                    name=f'Тег {number}',
+                    color=f'#0000{number:02}',
+                    slug=f'tag{number}',
+                )
+                for number in range(12)
+            ]
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+                for number in range(12)
+            ]
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def save(self, recipe, tags, ingredients, amount, **kwargs):
+        """Сохраняет рецепт, возвращает его и запросы записи."""
+        data = {
+            'tags': [tag.pk for tag in tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': amount}
+                for ingredient in ingredients
+            ],
+        }
+        if recipe is None:
+            data.update(
+                name='Рецепт',
+                text='Описание',
+                cooking_time=5,
+                image=make_image(),
+            )
+        serializer = RecipePostSerializer(
+            recipe, data=data, partial=recipe is not None
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with CaptureQueriesContext(connection) as queries:
+            recipe = serializer.save(**kwargs)
+        return recipe, queries.captured_queries
+
+    def create(self, size):
+        return self.save(
+            None,
+            self.tags[:size],
+            self.ingredients[:size],
+            10,
+            author=self.user,
+        )
+
+    def update(self, size):
+        """Меняет половину тегов и ингредиентов рецепта из size штук.
+
+        Часть строк удаляется, часть добавляется, у оставшихся
+        ингредиентов меняется количество.
+        """
+        recipe, _ = self.create(size)
+        shift = size // 2
+        return self.save(
+            recipe,
+            self.tags[shift:shift + size],
+            self.ingredients[shift:shift + size],
+            20,
+        )
+
+    def test_create_queries_do_not_grow(self):
+        _, queries = self.create(2)
+        _, more_queries = self.create(4)
+        self.assertEqual(len(queries), len(more_queries))
+
+    def test_update_queries_do_not_grow(self):
+        recipe, queries = self.update(4)
+        _, more_queries = self.update(8)
+        self.assertEqual(len(queries), len(more_queries))
+        self.assertEqual(
+            dict(
+                IngredientInRecipe.objects.filter(recipe=recipe).values_list(
+                    'ingredient', 'amount'
+                )
+            ),
+            {ingredient.pk: 20 for ingredient in self.ingredients[2:6]},
+        )
+        self.assertEqual(
+            sorted(recipe.tags.values_list('pk', flat=True)),
+            [tag.pk for tag in self.tags[2:6]],
+        )
+
+    def test_update_saves_recipe_once(self):
+        _, queries = self.update(4)
+        updates = [
+            query['sql']
+            for query in queries
+            if query['sql'].startswith('UPDATE "recipes_recipe"')
+        ]
+        self.assertEqual(len(updates), 1, updates)
+
+    def test_patch_queries_do_not_grow(self):
+        """PATCH с одним измененным ингредиентом через API."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        counts = []
+        for size in (4, 8):
+            recipe, _ = self.create(size)
+            data = {
+                'tags': [tag.pk for tag in self.tags[:size]],
+                'ingredients': [
+                    {'id': ingredient.pk, 'amount': 10 + (number == 0)}
+                    for number, ingredient in enumerate(
+                        self.ingredients[:size]
+                    )
+                ],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                response = client.patch(
+                    f'/api/recipes/{recipe.pk}/', data, format='json'
+                )
+            self.assertEqual(response.status_code, 200, response.data)
+            counts.append(len(queries.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class BulkRecipeSetTest(APITestCase):
+    """Массовые операции с избранным и списком покупок."""
+
+    SETS = (
+        ('favorite', 'favorites_count'),
+        ('shopping_cart', 'in_carts_count'),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        ingredient = Ingredient.objects.create(
+            name='Ингредиент', measurement_unit='г'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user,
+                name=f'Рецепт {number}',
+                image='recipes/image.png',
+                text='Описание',
+                cooking_time=5,
+            )
+            for number in range(3)
+        ]
+        IngredientInRecipe.objects.bulk_create(
+            [
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+                for recipe in cls.recipes
+            ]
+        )
+        cls.ids = [recipe.pk for recipe in cls.recipes]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def assertConsistent(self, counter_field):
+        for recipe in Recipe.objects.filter(pk__in=self.ids):
+            self.assertEqual(
+                getattr(recipe, counter_field),
+                recipe.favorites.count()
+                if counter_field == 'favorites_count'
+                else recipe.shoppingcart.count(),
+            )
+        self.assertEqual(
+            set(
+                CartIngredientTotal.objects.values_list(
+                    'user', 'ingredient', 'amount'
+                )
+            ),
+            set(get_cart_amounts()),
+        )
+
+    def test_replace_with_current_set(self):
+        for name, counter_field in self.SETS:
+            with self.subTest(name):
+                url = f'/api/recipes/{name}/'
+                self.client.post(url, {'ids': self.ids[:2]}, format='json')
+                response = self.client.put(
+                    url, {'ids': self.ids[:2]}, format='json'
+                )
+                self.assertEqual(response.status_code, 200, response.data)
+                self.assertEqual(
+                    [item['status'] for item in response.data['results']],
+                    ['exists', 'exists'],
+                )
+                self.assertConsistent(counter_field)
+
+    def test_remove_empty_ids(self):
+        for name, counter_field in self.SETS:
+            with self.subTest(name):
+                url = f'/api/recipes/{name}/'
+                self.client.post(url, {'ids': self.ids[:1]}, format='json')
+                response = self.client.delete(
+                    url, {'ids': []}, format='json'
+                )
+                self.assertEqual(response.status_code, 200, response.data)
+                self.assertEqual(response.data['results'], [])
+                recipe = Recipe.objects.get(pk=self.ids[0])
+                self.assertEqual(getattr(recipe, counter_field), 1)
+                self.assertConsistent(counter_field)
+
+    def test_single_then_bulk_add(self):
+        for name, counter_field in self.SETS:
+            with self.subTest(name):
+                response = self.client.post(
+                    f'/api/recipes/{self.ids[0]}/{name}/'
+                )
+                self.assertEqual(response.status_code, 201, response.data)
+                response = self.client.post(
+                    f'/api/recipes/{name}/', {'ids': self.ids}, format='json'
+                )
+                self.assertEqual(
+                    [item['status'] for item in response.data['results']],
+                    ['exists', 'added', 'added'],
+                )
+                self.assertConsistent(counter_field)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    },
+    SHOPPING_LIST_CACHE_DIR=MEDIA_ROOT,
+    SHOPPING_LIST_SYNC_MAX_ROWS=0,
+)
+class ShoppingListRenderTest(SimpleTestCase):
+    """Отметки фонового формирования pdf хранятся в общем кэше."""
+
+    ROWS = [('Ингредиент', 'г', 10)]
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(shopping_list, 'executor')
+        self.executor = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render_is_started_once(self):
+        self.assertIsNone(shopping_list.get_pdf(self.ROWS))
+        self.assertIsNone(shopping_list.get_pdf(self.ROWS))
+        self.executor.submit.assert_called_once()
+
+    def test_failure_is_reported_once(self):
+        key = shopping_list.get_cache_key(self.ROWS)
+        with mock.patch.object(
+            shopping_list, 'render_to_cache', side_effect=RuntimeError
+        ), self.assertLogs(shopping_list.logger, 'ERROR'):
+            shopping_list._render_in_background(self.ROWS, key)
+        with self.assertRaises(shopping_list.RenderFailed):
+            shopping_list.get_pdf(self.ROWS)
+        self.assertIsNone(shopping_list.get_pdf(self.ROWS))
+        self.executor.submit.assert_called_once()
+
+
+@override_settings(SUBSCRIPTION_RECIPES_LIMIT=2)
+class SubscriptionRecipesLimitTest(APITestCase):
+    """Число рецептов автора в подписках ограничено по умолчанию."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.other = [
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for username in ('user', 'author', 'other')
+        ]
+        for author in (cls.author, cls.other):
+            for number in range(3):
+                Recipe.objects.create(
+                    author=author,
+                    name=f'Рецепт {number}',
+                    image='recipes/image.png',
+                    text='Описание',
+                    cooking_time=5,
+                )
+        cls.user.follower.create(author=cls.author)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get_recipes_counts(self, query=''):
+        response = self.client.get(f'/api/users/subscriptions/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [len(item['recipes']) for item in response.data['results']]
+
+    def test_list_limit(self):
+        for query, expected in (
+            ('', 2),
+            ('?recipes_limit=abc', 2),
+            ('?recipes_limit=1', 1),
+            ('?recipes_limit=100', 2),
+        ):
+            with self.subTest(query):
+                self.assertEqual(self.get_recipes_counts(query), [expected])
+
+    def test_subscribe_limit(self):
+        for query, expected in (('', 2), ('?recipes_limit=1', 1)):
+            with self.subTest(query):
+                self.user.follower.filter(author=self.other).delete()
+                response = self.client.post(
+                    f'/api/users/{self.other.pk}/subscribe/{query}'
+                )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.data['recipes']), expected)
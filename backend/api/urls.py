@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import (FeedView, IngredientListView, RecipeDetailView,
+                          RecipeListView, ShoppingCartDownloadView)
 from .views import (CreateUserViewSet, FavoriteViewSet, IngredientViewSet,
                     RecipeViewSet, ShoppingCartViewSet, TagViewSet)
 
@@ -22,8 +25,45 @@ router_v1.register(
     basename='shopping_cart',
 )
 
+BULK_ACTIONS = {
+    'post': 'bulk_add',
+    'put': 'bulk_replace',
+    'delete': 'bulk_remove',
+}
+
 urlpatterns = [
+    path(
+        'recipes/favorite/',
+        FavoriteViewSet.as_view(BULK_ACTIONS),
+        name='favorite-bulk',
+    ),
+    path(
+        'recipes/shopping_cart/',
+        ShoppingCartViewSet.as_view(BULK_ACTIONS),
+        name='shopping_cart-bulk',
+    ),
     path('', include(router_v1.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('recipes/', RecipeListView.as_view(), name='recipes-list'),
+        path('recipes/feed/', FeedView.as_view(), name='recipes-feed'),
+        path(
+            'recipes/download_shopping_cart/',
+            ShoppingCartDownloadView.as_view(),
+            name='recipes-download-shopping-cart',
+        ),
+        path(
+            'recipes/<int:pk>/',
+            RecipeDetailView.as_view(),
+            name='recipes-detail',
+        ),
+        path(
+            'ingredients/',
+            IngredientListView.as_view(),
+            name='ingredients-list',
+        ),
+    ] + urlpatterns
@@ -1,31 +1,87 @@
-import io
-
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import (Exists, F, OuterRef, Prefetch, Subquery,
+                              Value)
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import (AllowAny, IsAuthenticated,
+                                        IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+from recipes.cart import add_to_totals, remove_from_totals
+from recipes.feed import get_feed
+from recipes.models import (CartIngredientTotal, Favorite, Ingredient,
+                            IngredientInRecipe, Recipe, ShoppingCart,
                             Subscription, Tag)
 from users.models import User
 
+from .catalogue import ingredient_list_response
 from .filters import IngredientSearchFilter, RecipeFilter
-from .pagination import LimitPageNumberPagination
+from .mixins import BulkRecipeSetMixin
+from .pagination import (FeedCursorPagination, LimitPageNumberPagination,
+                         OptionalCursorPagination, SubscriptionPagination,
+                         get_limit, get_recipes_limit)
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from .search import ingredient_index
 from .serializers import (IngredientSerializer, PasswordSerializer,
                           RecipeMinifieldSerializer, RecipePostSerializer,
                           RecipeSerializer, SubscriptionsSerializer,
                           TagSerializer, UserSerializer)
+from .shopping_list import (TEXT_FORMATS, get_shopping_list_pdf,
+                            get_shopping_list_queryset)
+
+FILENAME = 'my_shopping_cart'
+WRITE_ACTIONS = ('update', 'partial_update', 'destroy')
 
-FILENAME = 'my_shopping_cart.pdf'
+
+def latest_recipes(recipes_limit):
+    """Prefetch не более recipes_limit новых рецептов каждого автора.
+
+    Рецепты всех авторов страницы выбираются одним запросом: лимит
+    применяется коррелированным подзапросом по индексу
+    recipe_author_pub_date_idx (author, -pub_date, -id).
+    """
+    queryset = Recipe.objects.filter(
+        pk__in=Subquery(
+            Recipe.objects.filter(author=OuterRef('author'))
+            .order_by('-pub_date', '-id')
+            .values('pk')[:recipes_limit]
+        )
+    ).order_by('-pub_date', '-id')
+    return Prefetch('recipes', queryset=queryset, to_attr='latest_recipes')
+
+
+def get_recipe_queryset(user):
+    """Рецепты с заранее вычисленными флагами пользователя user."""
+    queryset = Recipe.objects.prefetch_related(
+        'tags',
+        Prefetch(
+            'recipesingredients',
+            queryset=IngredientInRecipe.objects.select_related('ingredient'),
+        ),
+    )
+    if user.is_anonymous:
+        return queryset.select_related('author')
+    authors = User.objects.annotate(
+        is_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef('pk'))
+        )
+    )
+    return queryset.prefetch_related(
+        Prefetch('author', queryset=authors)
+    ).annotate(
+        is_favorited=Exists(
+            Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+        ),
+        is_in_shopping_cart=Exists(
+            ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+        ),
+    )
 
 
 class CreateUserViewSet(UserViewSet):
@@ -79,9 +135,20 @@ class CreateUserViewSet(UserViewSet):
     @action(
         detail=False,
         permission_classes=(IsAuthenticated,),
+        pagination_class=SubscriptionPagination,
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        queryset = (
+            User.objects.filter(following__user=request.user)
+            .annotate(
+                subscribed_at=F('following__created'),
+                is_subscribed=Value(True),
+            )
+            .order_by('-subscribed_at', '-id')
+            .prefetch_related(
+                latest_recipes(get_recipes_limit(request))
+            )
+        )
         obj = self.paginate_queryset(queryset)
         serializer = SubscriptionsSerializer(
             obj, many=True, context={'request': request}
@@ -108,7 +175,9 @@ class CreateUserViewSet(UserViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
             Subscription.objects.create(user=user, author=author)
-            serializer = self.get_serializer(author)
+            serializer = SubscriptionsSerializer(
+                author, context={'request': request}
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         elif request.method == 'DELETE':
             subscribe = Subscription.objects.filter(user=user, author=author)
@@ -134,11 +203,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
 
     queryset = Recipe.objects.all()
-    permission_class = (IsAuthorOrReadOnly,)
-    pagination_classes = LimitPageNumberPagination
+    permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
+    pagination_class = OptionalCursorPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.action in WRITE_ACTIONS:
+            # Изменение и удаление не читают флаги и состав рецепта
+            return Recipe.objects.select_related('author')
+        return get_recipe_queryset(self.request.user)
+
+    def filter_queryset(self, queryset):
+        if self.action in WRITE_ACTIONS:
+            return queryset
+        return super().filter_queryset(queryset)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -148,50 +228,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
         else:
             return RecipePostSerializer
 
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedCursorPagination,
+    )
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь."""
+        queryset = get_feed(request.user, self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(
         url_path='download_shopping_cart',
         detail=False,
         permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            JSONRenderer,
+            PDFRenderer,
+            PlainTextRenderer,
+            CSVRenderer,
+        ),
     )
     def download_shopping_cart(self, request):
-        """Получение списка покупок в формате pdf."""
-        buffer = io.BytesIO()
-        page = canvas.Canvas(buffer)
-        pdfmetrics.registerFont(TTFont('List', 'data/List.ttf'))
-        x_position, y_position = 50, 800
-        shopping_cart = (
-            ShoppingCart.objects.filter(user=request.user)
-            .values(
-                'recipe__ingredients__name',
-                'recipe__ingredients__measurement_unit',
+        """Получение списка покупок в формате pdf, txt или csv.
+
+        Текст и csv передаются потоком по мере чтения из БД. Пока большой
+        pdf формируется в фоне, отвечает 202 с заголовком Retry-After:
+        запрос нужно повторить по тому же адресу. Если формирование не
+        удалось, отвечает 500.
+        """
+        file_format = request.accepted_renderer.format
+        if file_format in TEXT_FORMATS:
+            formatter, content_type = TEXT_FORMATS[file_format]
+            rows = get_shopping_list_queryset(request.user).iterator()
+            response = StreamingHttpResponse(
+                formatter(rows), content_type=content_type
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="{FILENAME}.{file_format}"'
             )
-            .annotate(amount=Sum('recipe__recipesingredients__amount'))
-            .order_by()
+            return response
+        path = get_shopping_list_pdf(request.user)
+        if path is None:
+            return Response(
+                data={'detail': 'Список покупок формируется.'},
+                status=status.HTTP_202_ACCEPTED,
+                headers={
+                    'Location': request.get_full_path(),
+                    'Retry-After': '1',
+                },
+            )
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True, filename=f'{FILENAME}.pdf'
         )
-        page.setFont('List', 14)
-        if shopping_cart:
-            indent = 20
-            page.drawString(x_position, y_position, 'Cписок покупок:')
-            for index, recipe in enumerate(shopping_cart, start=1):
-                page.drawString(
-                    x_position,
-                    y_position - indent,
-                    f'{index}. {recipe["recipe__ingredients__name"]} - '
-                    f'{recipe["amount"]} '
-                    f'{recipe["recipe__ingredients__measurement_unit"]}.',
-                )
-                y_position -= 15
-                if y_position <= 50:
-                    page.showPage()
-                    y_position = 800
-            page.save()
-            buffer.seek(0)
-            return FileResponse(buffer, as_attachment=True, filename=FILENAME)
-        page.setFont('List', 24)
-        page.drawString(x_position, y_position, 'Cписок покупок пуст!')
-        page.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename=FILENAME)
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -203,18 +296,37 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     filterset_class = IngredientSearchFilter
 
+    def list(self, request, *args, **kwargs):
+        """Список ингредиентов; поиск по имени идет по индексу в памяти."""
+        name = request.query_params.get('name')
+        limit = get_limit(request, 'limit')
+        if name:
+            return Response(ingredient_index.search(name, limit))
+        if limit is not None:
+            return Response(ingredient_index.all(limit))
+        if request.accepted_renderer.format == 'json':
+            return ingredient_list_response.respond(request)
+        return super().list(request, *args, **kwargs)
+
 
 class FavoriteViewSet(
-    mixins.CreateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+    BulkRecipeSetMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
 ):
     """Вьюсет для избранных рецептов."""
 
     queryset = Recipe.objects.all()
     serializer_class = RecipeMinifieldSerializer
     permission_classes = (IsAuthenticated,)
+    set_model = Favorite
+    counter_field = 'favorites_count'
 
+    @transaction.atomic
     def create(self, request, recipe_id):
         recipe = get_object_or_404(Recipe, pk=recipe_id)
+        self.lock_user(request.user)
         if Favorite.objects.filter(user=request.user, recipe=recipe).exists():
             return Response(
                 data={'detail': 'Этот рецепт уже есть в избранном!'},
@@ -224,9 +336,11 @@ class FavoriteViewSet(
         serializer = self.get_serializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, recipe_id):
         user = request.user
         recipe = get_object_or_404(Recipe, pk=recipe_id)
+        self.lock_user(user)
         favorite = Favorite.objects.filter(user=user, recipe=recipe)
         if not favorite.exists():
             return Response(
@@ -241,7 +355,7 @@ class FavoriteViewSet(
         )
 
 
-class ShoppingCartViewSet(viewsets.ModelViewSet):
+class ShoppingCartViewSet(BulkRecipeSetMixin, viewsets.ModelViewSet):
     """Вьюсет для списка покупок."""
 
     queryset = Recipe.objects.all()
@@ -251,9 +365,22 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
         IsAuthorOrReadOnly,
         IsAuthenticated,
     )
+    set_model = ShoppingCart
+    counter_field = 'in_carts_count'
+
+    def after_add(self, user, recipe_ids):
+        add_to_totals(recipe_ids, user)
+
+    def before_remove(self, user, recipe_ids, clear):
+        if clear:
+            CartIngredientTotal.objects.filter(user=user).delete()
+        else:
+            remove_from_totals(recipe_ids, user)
 
+    @transaction.atomic
     def create(self, request, recipe_id):
         recipe = get_object_or_404(Recipe, pk=recipe_id)
+        self.lock_user(request.user)
         if ShoppingCart.objects.filter(
             user=request.user, recipe=recipe
         ).exists():
@@ -262,18 +389,22 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         ShoppingCart.objects.create(user=request.user, recipe=recipe)
+        add_to_totals([recipe.pk], request.user)
         serializer = self.get_serializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, recipe_id):
         user = request.user
         recipe = get_object_or_404(Recipe, pk=recipe_id)
+        self.lock_user(user)
         cart = ShoppingCart.objects.filter(user=user, recipe=recipe)
         if not cart.exists():
             return Response(
                 data={'detail': 'Рецепта еще нет в списке покупок!'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        remove_from_totals([recipe.pk], user)
         cart.delete()
         return Response(
             f'Рецепт {cart} удален из списка покупок у пользователя'
@@ -0,0 +1,154 @@
+"""Метрики приложения в формате Prometheus.
+
+В нескольких процессах gunicorn метрики пишутся в файлы каталога
+PROMETHEUS_MULTIPROC_DIR и собираются при чтении /metrics.
+"""
+
+import asyncio
+import ipaddress
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+from .middleware import awrap_connections, wrap_connections
+
+if settings.METRICS_ENABLED:
+    try:
+        import prometheus_client
+        from prometheus_client import multiprocess
+    except ImportError:
+        raise ImproperlyConfigured(
+            'Для сбора метрик установите prometheus_client'
+        )
+
+    REQUESTS = prometheus_client.Counter(
+        'foodgram_http_requests_total',
+        'Число HTTP-запросов',
+        ['view', 'method', 'status'],
+    )
+    LATENCY = prometheus_client.Histogram(
+        'foodgram_http_request_duration_seconds',
+        'Время обработки HTTP-запроса',
+        ['view', 'method'],
+        buckets=(
+            0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+        ),
+    )
+    DB_QUERIES = prometheus_client.Histogram(
+        'foodgram_db_queries_per_request',
+        'Число запросов к базе на HTTP-запрос',
+        ['view'],
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+    )
+    DB_DURATION = prometheus_client.Histogram(
+        'foodgram_db_duration_seconds',
+        'Время запросов к базе на HTTP-запрос',
+        ['view'],
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+    )
+    CACHE_REQUESTS = prometheus_client.Counter(
+        'foodgram_cache_requests_total',
+        'Обращения к кэшам приложения',
+        ['cache', 'result'],
+    )
+
+
+def record_cache(name, hit):
+    """Учитывает попадание или промах кэша name."""
+    if settings.METRICS_ENABLED:
+        CACHE_REQUESTS.labels(name, 'hit' if hit else 'miss').inc()
+
+
+class QueryCounter:
+    """Обертка execute_wrapper, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Число запросов, время ответа и запросы к базе по маршрутам.
+
+    Включается настройкой METRICS_ENABLED. Маршрут берется из имени
+    view, чтобы число рядов не зависело от id в адресах. Под ASGI
+    работает без перехода в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django определяет асинхронный middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with wrap_connections(queries):
+            response = self.get_response(request)
+        return self.record(request, response, queries, started)
+
+    async def __acall__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with await awrap_connections(queries):
+            response = await self.get_response(request)
+        return self.record(request, response, queries, started)
+
+    def record(self, request, response, queries, started):
+        duration = time.perf_counter() - started
+        resolver_match = request.resolver_match
+        view = resolver_match.view_name if resolver_match else 'unmatched'
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        LATENCY.labels(view, request.method).observe(duration)
+        DB_QUERIES.labels(view).observe(queries.count)
+        DB_DURATION.labels(view).observe(queries.duration)
+        return response
+
+
+def is_internal(request):
+    """Запрос пришел напрямую из внутренней сети, а не через прокси."""
+    if 'HTTP_X_FORWARDED_FOR' in request.META:
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def metrics_view(request):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    if not is_internal(request):
+        raise Http404
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return HttpResponse(
+        prometheus_client.generate_latest(registry),
+        content_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
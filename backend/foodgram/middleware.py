@@ -0,0 +1,147 @@
+"""Учет запросов к базе данных на каждый HTTP-запрос."""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+MAX_DUPLICATES_LOGGED = 5
+
+
+def get_fingerprint(sql):
+    """SQL без значений: одинаковый для запросов одной формы."""
+    sql = LITERALS.sub('?', sql)
+    return PLACEHOLDER_LISTS.sub('(...)', sql)
+
+
+def wrap_connections(wrapper):
+    """Подключает execute_wrapper ко всем базам текущего потока.
+
+    Возвращает ExitStack: обертка отключается при выходе из него.
+    """
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+    return stack
+
+
+async def awrap_connections(wrapper):
+    """wrap_connections() для асинхронных middleware.
+
+    Под ASGI ORM работает в потоке sync_to_async со своими
+    подключениями, поэтому обертка подключается в нем.
+    """
+    return await sync_to_async(wrap_connections)(wrapper)
+
+
+class QueryStats:
+    """Обертка execute_wrapper, считающая запросы одного HTTP-запроса."""
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def get_view_name(self):
+        resolver_match = self.request.resolver_match
+        return resolver_match.view_name if resolver_match else None
+
+    def get_duplicates(self):
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.fingerprints.most_common(
+                MAX_DUPLICATES_LOGGED
+            )
+            if count > 1
+        ]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            self.fingerprints[get_fingerprint(sql)] += 1
+            if duration * 1000 >= settings.DB_SLOW_QUERY_MS:
+                logger.warning(
+                    'Медленный запрос %.1f мс в %s: %s',
+                    duration * 1000,
+                    self.get_view_name() or self.request.path,
+                    sql,
+                )
+
+
+class DBInstrumentationMiddleware:
+    """Число запросов, время в базе и повторы SQL в заголовках и логе.
+
+    Включается настройкой DB_INSTRUMENTATION; без нее Django исключает
+    middleware при запуске, и накладных расходов нет. Под ASGI
+    работает без перехода в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DB_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django определяет асинхронный middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = QueryStats(request)
+        started = time.perf_counter()
+        with wrap_connections(stats):
+            response = self.get_response(request)
+        return self.report(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = QueryStats(request)
+        started = time.perf_counter()
+        with await awrap_connections(stats):
+            response = await self.get_response(request)
+        return self.report(request, response, stats, started)
+
+    def report(self, request, response, stats, started):
+        total = time.perf_counter() - started
+        duplicates = stats.get_duplicates()
+        response['X-DB-Queries'] = stats.count
+        response['Server-Timing'] = (
+            f'db;dur={stats.duration * 1000:.1f};'
+            f'desc="{stats.count} queries, {len(duplicates)} repeated", '
+            f'app;dur={total * 1000:.1f}'
+        )
+        logger.info(json.dumps(
+            {
+                'method': request.method,
+                'path': request.path,
+                'view': stats.get_view_name(),
+                'status': response.status_code,
+                'duration_ms': round(total * 1000, 1),
+                'db_queries': stats.count,
+                'db_duration_ms': round(stats.duration * 1000, 1),
+                'db_duplicates': duplicates,
+            },
+            ensure_ascii=False,
+        ))
+        return response
@@ -0,0 +1,249 @@
+"""Профилирование отдельных запросов по подписанному токену сотрудника."""
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404, HttpResponse
+
+SALT = 'foodgram.profiler'
+TOKEN_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID = re.compile(r'[0-9a-f]{32}')
+EXTENSIONS = {'cprofile': 'prof', 'sample': 'collapsed'}
+TEXT_REPORT_LINES = 60
+
+
+def make_profile_token(user):
+    """Подписанный токен, включающий профилирование для сотрудника."""
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def get_profiling_user(token):
+    """Сотрудник, которому выдан токен, или None."""
+    try:
+        user_id = signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=settings.PROFILER_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    return get_user_model().objects.filter(
+        pk=user_id, is_staff=True, is_active=True
+    ).first()
+
+
+class Sampler:
+    """Сэмплирующий профилировщик одного потока.
+
+    Фоновый поток снимает стек профилируемого потока раз в interval
+    секунд и копит стеки в формате collapsed для flamegraph.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if self.stopped.is_set():
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{code.co_name} '
+                    f'({os.path.basename(code.co_filename)}:'
+                    f'{code.co_firstlineno})'
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def dump_stats(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+def get_profile_path(profile_id, mode):
+    return os.path.join(
+        settings.PROFILER_DIR, f'{profile_id}.{EXTENSIONS[mode]}'
+    )
+
+
+def prune_profiles():
+    """Удаляет профили старше PROFILER_MAX_AGE и сверх PROFILER_MAX_FILES."""
+    deadline = time.time() - settings.PROFILER_MAX_AGE
+    profiles = []
+    with os.scandir(settings.PROFILER_DIR) as entries:
+        for entry in entries:
+            try:
+                modified = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            profiles.append((modified, entry.path))
+    profiles.sort(reverse=True)
+    for number, (modified, path) in enumerate(profiles):
+        if number >= settings.PROFILER_MAX_FILES or modified < deadline:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def get_text_report(path):
+    if path.endswith('.collapsed'):
+        with open(path, encoding='utf-8') as file:
+            return file.read()
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.sort_stats('cumulative').print_stats(TEXT_REPORT_LINES)
+    return output.getvalue()
+
+
+class ProfilerMiddleware:
+    """Профилирует запрос, если передан токен сотрудника.
+
+    Токен передается только в заголовке X-Profile, чтобы не попадать
+    в журналы доступа. Профиль сохраняется в PROFILER_DIR, его id
+    возвращается в заголовке X-Profile-Id; с profile_output=inline
+    вместо ответа возвращается текстовый отчет. Старые профили
+    удаляются, в каталоге остается не больше PROFILER_MAX_FILES.
+    Без настройки PROFILER_ENABLED middleware отключается при запуске.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django определяет асинхронный middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+
+    def get_mode(self, request):
+        """Режим профилирования или None, если токена сотрудника нет."""
+        token = request.META.get(TOKEN_HEADER)
+        if not token or get_profiling_user(token) is None:
+            return None
+        mode = request.GET.get('profile_mode', settings.PROFILER_MODE)
+        if mode not in EXTENSIONS:
+            mode = settings.PROFILER_MODE
+        return mode
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode = self.get_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        profiler = self.get_profiler(request, mode)
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+            if response.streaming:
+                response.streaming_content = list(
+                    response.streaming_content
+                )
+        finally:
+            profiler.disable()
+        return self.save_profile(
+            request, response, profiler, mode, time.perf_counter() - started
+        )
+
+    async def __acall__(self, request):
+        # Профилируется поток цикла событий: работа синхронного кода
+        # в потоках sync_to_async в профиль не попадает
+        mode = await sync_to_async(self.get_mode)(request)
+        if mode is None:
+            return await self.get_response(request)
+        profiler = self.get_profiler(request, mode)
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        return await sync_to_async(self.save_profile)(
+            request, response, profiler, mode, time.perf_counter() - started
+        )
+
+    def save_profile(self, request, response, profiler, mode, elapsed):
+        profile_id = uuid.uuid4().hex
+        path = get_profile_path(profile_id, mode)
+        profiler.dump_stats(path)
+        prune_profiles()
+        if request.GET.get('profile_output') == 'inline':
+            response = HttpResponse(
+                get_text_report(path), content_type='text/plain'
+            )
+        response['X-Profile-Id'] = profile_id
+        response['Server-Timing'] = f'profiled;dur={elapsed * 1000:.1f}'
+        return response
+
+    def get_profiler(self, request, mode):
+        if mode == 'cprofile':
+            return cProfile.Profile()
+        try:
+            interval = float(request.GET['profile_interval'])
+        except (KeyError, ValueError):
+            interval = settings.PROFILER_SAMPLE_INTERVAL_MS
+        interval = min(max(interval, 1), 1000)
+        return Sampler(interval / 1000)
+
+
+def profile_view(request, profile_id):
+    """Сохраненный профиль: ?format=text (по умолчанию) или raw.
+
+    raw отдает файл pstats или collapsed-стеки для flamegraph.pl
+    и speedscope. Доступен сотрудникам по сессии или токену.
+    """
+    token = request.META.get(TOKEN_HEADER)
+    if not (
+        request.user.is_staff
+        or token and get_profiling_user(token) is not None
+    ):
+        raise Http404
+    if not PROFILE_ID.fullmatch(profile_id):
+        raise Http404
+    for mode in EXTENSIONS:
+        path = get_profile_path(profile_id, mode)
+        if os.path.exists(path):
+            break
+    else:
+        raise Http404
+    if request.GET.get('format') == 'raw':
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=os.path.basename(path),
+        )
+    return HttpResponse(get_text_report(path), content_type='text/plain')
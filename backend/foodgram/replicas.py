@@ -0,0 +1,149 @@
+"""Чтение с реплик базы данных для безопасных запросов к API.
+
+ReplicaMiddleware выбирает реплику на время GET, HEAD и OPTIONS запроса,
+ReplicaRouter направляет на нее чтение. На основную базу уходят:
+запись и все чтения после нее в том же запросе, чтения внутри
+транзакции, токены и сессии, запросы вне HTTP (команды, фоновые потоки)
+и все запросы клиента в течение DB_REPLICA_STICKY_SECONDS после его
+записи, чтобы он сразу видел свое избранное и корзину.
+
+Отметку о записи клиент хранит в подписанной cookie: она действует на
+всех серверах приложения и не пропадает при вытеснении из кэша.
+"""
+
+import asyncio
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+
+# Отзыв токена или выход должны действовать сразу, без задержки реплики
+PRIMARY_MODELS = ('authtoken.token', 'sessions.session')
+STICKY_COOKIE = 'db_primary_pin'
+STICKY_SALT = 'foodgram.replicas'
+
+_routing = ContextVar('replica_routing', default=None)
+
+
+class Routing:
+    """Выбор базы для чтения в рамках одного HTTP-запроса."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.wrote = False
+
+    def pin(self):
+        self.alias = DEFAULT_DB_ALIAS
+
+
+def get_replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def is_pinned(request):
+    """Писал ли клиент в течение DB_REPLICA_STICKY_SECONDS."""
+    return bool(
+        request.get_signed_cookie(
+            STICKY_COOKIE,
+            default=None,
+            salt=STICKY_SALT,
+            max_age=settings.DB_REPLICA_STICKY_SECONDS,
+        )
+    )
+
+
+def pin_client(request, response, routing):
+    """Отмечает записавшего клиента до конца окна DB_REPLICA_STICKY_SECONDS."""
+    if routing.wrote or request.method not in SAFE_METHODS:
+        response.set_signed_cookie(
+            STICKY_COOKIE,
+            '1',
+            salt=STICKY_SALT,
+            max_age=settings.DB_REPLICA_STICKY_SECONDS,
+            secure=request.is_secure(),
+            httponly=True,
+            samesite='Lax',
+        )
+    return response
+
+
+class ReplicaRouter:
+    """Роутер: чтение с реплики текущего запроса, запись в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if (
+            routing is None
+            or model._meta.label_lower in PRIMARY_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return routing.alias
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+            routing.pin()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Выбор базы для чтения на время запроса.
+
+    Включается при наличии реплик в DATABASES (настройка DB_REPLICAS).
+    Работает и под ASGI без перехода в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.replicas = get_replica_aliases()
+        if not self.replicas:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django определяет асинхронный middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def start(self, request):
+        if request.method in SAFE_METHODS and not is_pinned(request):
+            routing = Routing(random.choice(self.replicas))
+        else:
+            routing = Routing(DEFAULT_DB_ALIAS)
+        _routing.set(routing)
+        return routing
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        routing = self.start(request)
+        return pin_client(request, self.get_response(request), routing)
+
+    async def __acall__(self, request):
+        routing = self.start(request)
+        return pin_client(request, await self.get_response(request), routing)
+
+
+@receiver(request_finished)
+def reset_routing(sender, **kwargs):
+    """Сбрасывает выбор после отдачи ответа, включая потоковые.
+
+    Поток сервера обслуживает следующие запросы, и вне запроса чтение
+    должно идти с основной базы.
+    """
+    _routing.set(None)
@@ -44,12 +44,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
+    'foodgram.middleware.DBInstrumentationMiddleware',
+    'foodgram.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -73,6 +77,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
 
 
 # Database
@@ -92,6 +97,18 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', default='/tmp/foodgram_cache'
+        ),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -171,9 +188,157 @@ MEDIA_URL = '/backend_media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'backend_media')
 
+# Хранилище медиафайлов: local - MEDIA_ROOT, s3 - S3-совместимый сервис
+MEDIA_STORAGES = {
+    'local': 'recipes.storage.ContentHashStorage',
+    's3': 'recipes.storage.S3ContentHashStorage',
+}
+DEFAULT_FILE_STORAGE = MEDIA_STORAGES[os.getenv('MEDIA_STORAGE', 'local')]
+
+AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME', 'foodgram')
+AWS_LOCATION = os.getenv('AWS_LOCATION', default='media')
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') or None
+AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME') or None
+# Ссылки на файлы постоянные: через CDN или напрямую в публичный бакет;
+# подписанные на AWS_QUERYSTRING_EXPIRE секунд - для закрытого бакета
+AWS_S3_CUSTOM_DOMAIN = os.getenv('AWS_S3_CUSTOM_DOMAIN') or None
+AWS_QUERYSTRING_AUTH = os.getenv(
+    'AWS_QUERYSTRING_AUTH', default='false'
+).lower() in ('1', 'true', 'yes')
+AWS_QUERYSTRING_EXPIRE = int(
+    os.getenv('AWS_QUERYSTRING_EXPIRE', default=3600)
+)
+AWS_S3_MULTIPART_THRESHOLD = int(
+    os.getenv('AWS_S3_MULTIPART_THRESHOLD', default=8 * 1024 * 1024)
+)
+AWS_S3_MULTIPART_CHUNKSIZE = int(
+    os.getenv('AWS_S3_MULTIPART_CHUNKSIZE', default=8 * 1024 * 1024)
+)
+AWS_S3_MAX_CONCURRENCY = int(os.getenv('AWS_S3_MAX_CONCURRENCY', default=4))
+# Освобожденный файл, сохраненный позже этого срока назад, не удаляется
+# сразу: ссылка на него может быть в еще не зафиксированной транзакции
+MEDIA_RELEASE_GRACE_SECONDS = int(
+    os.getenv('MEDIA_RELEASE_GRACE_SECONDS', default=600)
+)
+
 AUTH_USER_MODEL = 'users.User'
 
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^/api/.*$'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Как часто процесс перечитывает версию справочника ингредиентов из кэша:
+# изменения из других процессов видны с такой задержкой
+CATALOGUE_VERSION_CHECK_SECONDS = float(
+    os.getenv('CATALOGUE_VERSION_CHECK_SECONDS', default=2)
+)
+
+# Сколько новых рецептов автора показывать в подписках без recipes_limit;
+# больший recipes_limit тоже ограничивается этим числом
+SUBSCRIPTION_RECIPES_LIMIT = int(
+    os.getenv('SUBSCRIPTION_RECIPES_LIMIT', default=10)
+)
+
+# Лента подписок: рассылка рецептов в ленты подписчиков при публикации
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', default=1000))
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', default=100))
+FEED_FAN_OUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FAN_OUT_MAX_FOLLOWERS', default=10000)
+)
+
+# Список покупок: кэш pdf по содержимому корзины и фоновое формирование;
+# файлы старше MAX_AGE секунд и сверх MAX_SIZE байт удаляются
+SHOPPING_LIST_CACHE_DIR = os.getenv(
+    'SHOPPING_LIST_CACHE_DIR', default='/tmp/foodgram_shopping_lists'
+)
+SHOPPING_LIST_CACHE_MAX_AGE = int(
+    os.getenv('SHOPPING_LIST_CACHE_MAX_AGE', default=24 * 3600)
+)
+SHOPPING_LIST_CACHE_MAX_SIZE = int(
+    os.getenv('SHOPPING_LIST_CACHE_MAX_SIZE', default=256 * 1024 * 1024)
+)
+SHOPPING_LIST_SYNC_MAX_ROWS = int(
+    os.getenv('SHOPPING_LIST_SYNC_MAX_ROWS', default=50)
+)
+SHOPPING_LIST_WORKERS = int(os.getenv('SHOPPING_LIST_WORKERS', default=2))
+# Сколько секунд хранятся отметки о фоновом формировании pdf и его ошибке
+SHOPPING_LIST_RENDER_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_RENDER_TIMEOUT', default=300)
+)
+
+# Изображения рецептов: ширины уменьшенных копий и число фоновых потоков
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+# Учет запросов к базе: заголовки Server-Timing и X-DB-Queries, лог
+DB_INSTRUMENTATION = os.getenv(
+    'DB_INSTRUMENTATION', default='false'
+).lower() in ('1', 'true', 'yes')
+DB_SLOW_QUERY_MS = int(os.getenv('DB_SLOW_QUERY_MS', default=200))
+
+# Профилирование запросов по подписанному токену сотрудника:
+# cprofile - pstats, sample - сэмплирование стеков для flamegraph
+PROFILER_ENABLED = os.getenv(
+    'PROFILER_ENABLED', default='false'
+).lower() in ('1', 'true', 'yes')
+PROFILER_MODE = os.getenv('PROFILER_MODE', default='sample')
+PROFILER_SAMPLE_INTERVAL_MS = float(
+    os.getenv('PROFILER_SAMPLE_INTERVAL_MS', default=5)
+)
+PROFILER_TOKEN_MAX_AGE = int(
+    os.getenv('PROFILER_TOKEN_MAX_AGE', default=3600)
+)
+PROFILER_DIR = os.getenv('PROFILER_DIR', default='/tmp/foodgram_profiles')
+# Профили хранятся не дольше PROFILER_MAX_AGE секунд, не больше
+# PROFILER_MAX_FILES последних
+PROFILER_MAX_AGE = int(os.getenv('PROFILER_MAX_AGE', default=24 * 3600))
+PROFILER_MAX_FILES = int(os.getenv('PROFILER_MAX_FILES', default=200))
+
+# Метрики Prometheus на /metrics, доступные только из внутренней сети;
+# для нескольких воркеров задайте PROMETHEUS_MULTIPROC_DIR
+METRICS_ENABLED = os.getenv(
+    'METRICS_ENABLED', default='false'
+).lower() in ('1', 'true', 'yes')
+METRICS_ALLOWED_NETWORKS = os.getenv(
+    'METRICS_ALLOWED_NETWORKS',
+    default='127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16',
+).split(',')
+
+# Реплики для чтения: DB_REPLICAS=host[:port],... с теми же учетными
+# данными; DB_REPLICA_NAME задает другое имя базы (например, файл SQLite)
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1
+):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['foodgram.replicas.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', default=10)
+)
+
+# Асинхронные представления для I/O-нагруженных запросов; включается
+# в foodgram/asgi.py (gunicorn с SERVER_MODE=asgi, воркеры uvicorn)
+ASYNC_VIEWS = os.getenv(
+    'ASYNC_VIEWS', default='false'
+).lower() in ('1', 'true', 'yes')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram': {
+            'handlers': ['console'],
+            'level': os.getenv('FOODGRAM_LOG_LEVEL', default='INFO'),
+        },
+    },
+}
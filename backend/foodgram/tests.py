@@ -0,0 +1,150 @@
+from unittest import mock, skipUnless
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase,
+                         TransactionTestCase)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import User
+
+from .replicas import (STICKY_COOKIE, ReplicaMiddleware, ReplicaRouter,
+                       get_replica_aliases)
+
+REPLICA = 'replica_1'
+
+
+class ReplicaMiddlewareTest(SimpleTestCase):
+    """Выбор базы для чтения без обращений к базам."""
+
+    def setUp(self):
+        patcher = mock.patch(
+            'foodgram.replicas.get_replica_aliases', return_value=[REPLICA]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def run_request(self, request, write=False):
+        """Ответ middleware и базы, выбранные для чтения в представлении."""
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Recipe))
+            if write:
+                self.router.db_for_write(Recipe)
+                reads.append(self.router.db_for_read(Recipe))
+            return HttpResponse()
+
+        response = ReplicaMiddleware(view)(request)
+        return response, reads
+
+    def test_get_reads_from_replica(self):
+        response, reads = self.run_request(self.factory.get('/api/recipes/'))
+        self.assertEqual(reads, [REPLICA])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_write_pins_request_and_client(self):
+        response, reads = self.run_request(
+            self.factory.get('/api/recipes/'), write=True
+        )
+        self.assertEqual(reads, [REPLICA, DEFAULT_DB_ALIAS])
+        request = self.factory.get('/api/recipes/')
+        request.COOKIES[STICKY_COOKIE] = response.cookies[STICKY_COOKIE].value
+        _, reads = self.run_request(request)
+        self.assertEqual(reads, [DEFAULT_DB_ALIAS])
+
+    def test_unsafe_method_reads_from_primary(self):
+        response, reads = self.run_request(self.factory.post('/api/recipes/'))
+        self.assertEqual(reads, [DEFAULT_DB_ALIAS])
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_tampered_cookie_is_ignored(self):
+        for value in ('1', '1:forged:signature'):
+            with self.subTest(value):
+                request = self.factory.get('/api/recipes/')
+                request.COOKIES[STICKY_COOKIE] = value
+                _, reads = self.run_request(request)
+                self.assertEqual(reads, [REPLICA])
+
+    def test_tokens_read_from_primary(self):
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Token))
+
+        response = ReplicaMiddleware(view)(self.factory.get('/api/recipes/'))
+        self.assertEqual(response.content.decode(), DEFAULT_DB_ALIAS)
+
+
+@skipUnless(
+    REPLICA in get_replica_aliases(),
+    'Нужна реплика: запустите тесты с DB_REPLICAS=<хост>',
+)
+class ReplicaRoutingTest(TransactionTestCase):
+    """Запросы API на реплике-зеркале основной базы (TEST MIRROR).
+
+    Внутри транзакции TestCase роутер читает с основной базы, поэтому
+    данные фиксируются.
+    """
+
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name='Рецепт',
+            image='recipes/image.png',
+            text='Описание',
+            cooking_time=5,
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def request(self, method, url):
+        """Ответ и число запросов к основной базе и к реплике."""
+        with CaptureQueriesContext(
+            connections[DEFAULT_DB_ALIAS]
+        ) as primary, CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = getattr(self.client, method)(url)
+        return (
+            response,
+            len(primary.captured_queries),
+            len(replica.captured_queries),
+        )
+
+    def test_reads_go_to_replica(self):
+        response, _, replica = self.request('get', '/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(replica, 0)
+
+    def test_write_pins_client_to_primary(self):
+        response, primary, _ = self.request(
+            'post', f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        response, primary, replica = self.request('get', '/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_tampered_cookie_reads_from_replica(self):
+        self.client.cookies[STICKY_COOKIE] = '1:forged:signature'
+        _, _, replica = self.request('get', '/api/recipes/')
+        self.assertGreater(replica, 0)
+
+    def test_reads_in_transaction_go_to_primary(self):
+        with transaction.atomic():
+            _, _, replica = self.request('get', '/api/recipes/')
+        self.assertEqual(replica, 0)
@@ -3,12 +3,27 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import metrics_view
+from .profiling import profile_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 ]
 
 
+if settings.PROFILER_ENABLED:
+    urlpatterns.append(
+        path(
+            'api/profiles/<str:profile_id>/', profile_view, name='profile'
+        )
+    )
+
+
+if settings.METRICS_ENABLED:
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))
+
+
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
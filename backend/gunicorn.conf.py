@@ -0,0 +1,28 @@
+"""Настройки gunicorn: режим воркеров и общий каталог метрик.
+
+SERVER_MODE=asgi запускает foodgram.asgi на воркерах uvicorn, по умолчанию
+foodgram.wsgi работает на синхронных воркерах.
+"""
+
+import os
+import shutil
+
+SERVER_MODE = os.getenv('SERVER_MODE', default='wsgi')
+
+wsgi_app = f'foodgram.{SERVER_MODE}:application'
+if SERVER_MODE == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+
+
+def on_starting(server):
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
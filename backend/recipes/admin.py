@@ -1,7 +1,11 @@
 from django.contrib import admin
+from django.db import transaction
 
+from .cart import rebuild_totals
+from .images import schedule_renditions
 from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
                      ShoppingCart, Subscription, Tag, TagRecipe)
+from .storage import release_image
 
 
 class IngredientInRecipeInline(admin.TabularInline):
@@ -38,16 +42,50 @@ class RecipeAdmin(admin.ModelAdmin):
     """Админка рецептов."""
 
     inlines = (IngredientInRecipeInline, TagRecipeInline)
-    list_display = ('id', 'name', 'author', 'text', 'image', 'cooking_time')
+    list_display = (
+        'id',
+        'name',
+        'author',
+        'text',
+        'image',
+        'cooking_time',
+        'count_favorite',
+    )
     search_fields = ('name', 'author', 'tags')
     list_filter = ('name', 'author', 'tags')
     empty_value_display = '-пусто-'
 
     def count_favorite(self, obj):
         """Метод подсчета общего числа добавлений этого рецепта в избранное."""
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     count_favorite.short_description = 'Количество добавлений в избранное'
+    count_favorite.admin_order_field = 'favorites_count'
+
+    def save_model(self, request, obj, form, change):
+        """Пересоздает копии нового изображения и освобождает прежнее."""
+        if 'image' in form.changed_data:
+            if change:
+                old_image, old_renditions = Recipe.objects.values_list(
+                    'image', 'image_renditions'
+                ).get(pk=obj.pk)
+                transaction.on_commit(
+                    lambda: release_image(old_image, old_renditions)
+                )
+            schedule_renditions(obj)
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        """Пересчитывает корзины с рецептом после изменения ингредиентов."""
+        super().save_related(request, form, formsets, change)
+        if change:
+            rebuild_totals(
+                list(
+                    ShoppingCart.objects.filter(
+                        recipe=form.instance
+                    ).values_list('user', flat=True)
+                )
+            )
 
 
 class FavoriteAdmin(admin.ModelAdmin):
@@ -68,13 +106,33 @@ class SubscriptionAdmin(admin.ModelAdmin):
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
-    """Админка списка покупок."""
+    """Админка списка покупок.
+
+    Суммы ингредиентов корзин, из которых строится список покупок,
+    пересчитываются для затронутых пользователей.
+    """
 
     list_display = ('user', 'recipe', 'id')
     search_fields = ('user',)
     list_filter = ('user',)
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        users = [obj.user_id]
+        if change and 'user' in form.changed_data:
+            users.append(form.initial['user'])
+        super().save_model(request, obj, form, change)
+        rebuild_totals(users)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_totals([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        users = list(set(queryset.values_list('user', flat=True)))
+        super().delete_queryset(request, queryset)
+        rebuild_totals(users)
+
 
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Tag, TagAdmin)
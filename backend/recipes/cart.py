@@ -0,0 +1,87 @@
+"""Поддержка суммарных количеств ингредиентов в списках покупок."""
+
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import CartIngredientTotal, IngredientInRecipe, ShoppingCart
+
+
+def get_cart_amounts(**filters):
+    """Суммы ингредиентов корзин: строки (user_id, ingredient_id, amount).
+
+    Фильтры задаются относительно ShoppingCart.
+    """
+    carts = ShoppingCart.objects.filter(**filters).values('pk')
+    return (
+        IngredientInRecipe.objects.filter(recipe__shoppingcart__in=carts)
+        .values_list('recipe__shoppingcart__user', 'ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+
+
+def add_to_totals(recipe_ids, user=None):
+    """Добавляет ингредиенты рецептов к суммам корзин одним upsert.
+
+    Рецепты уже должны быть в корзине; без user обновляются корзины всех
+    пользователей, у которых есть эти рецепты.
+    """
+    if not recipe_ids:
+        return
+    filters = {'recipe__in': recipe_ids}
+    if user is not None:
+        filters['user'] = user
+    select, params = get_cart_amounts(**filters).query.sql_with_params()
+    table = connection.ops.quote_name(CartIngredientTotal._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, ingredient_id, amount) {select} '
+            f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+            f'SET amount = {table}.amount + EXCLUDED.amount',
+            params,
+        )
+
+
+def remove_from_totals(recipe_ids, user=None):
+    """Вычитает ингредиенты рецептов из сумм корзин.
+
+    Вызывается, пока рецепты еще в корзине; нулевые суммы удаляются.
+    """
+    carts = ShoppingCart.objects.filter(recipe__in=recipe_ids)
+    if user is not None:
+        carts = carts.filter(user=user)
+    amounts = (
+        IngredientInRecipe.objects.filter(
+            recipe__in=carts.filter(user=OuterRef(OuterRef('user'))).values(
+                'recipe'
+            ),
+            ingredient=OuterRef('ingredient'),
+        )
+        .values('ingredient')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    totals = CartIngredientTotal.objects.filter(
+        user__in=carts.values('user'),
+        ingredient__in=IngredientInRecipe.objects.filter(
+            recipe__in=recipe_ids
+        ).values('ingredient'),
+    )
+    totals.update(
+        amount=Greatest(F('amount') - Coalesce(Subquery(amounts), 0), 0)
+    )
+    totals.filter(amount=0).delete()
+
+
+def rebuild_totals(user_ids):
+    """Пересчитывает суммы корзин пользователей с нуля."""
+    CartIngredientTotal.objects.filter(user__in=user_ids).delete()
+    CartIngredientTotal.objects.bulk_create(
+        CartIngredientTotal(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for user_id, ingredient_id, amount in get_cart_amounts(
+            user__in=user_ids
+        )
+    )
@@ -0,0 +1,102 @@
+"""Версия справочника ингредиентов, общая для всех процессов.
+
+Версия хранится в кэше Django, а процесс перечитывает ее не чаще раза
+в CATALOGUE_VERSION_CHECK_SECONDS: изменения из других процессов видны
+с этой задержкой, из текущего - сразу.
+"""
+
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.metrics import record_cache
+
+VERSION_KEY = 'ingredients:version'
+
+# (версия, время проверки по time.monotonic())
+_checked = (None, 0.0)
+
+
+def get_checked_version():
+    """Версия, проверенная недавно, или None, если пора перечитать."""
+    version, checked_at = _checked
+    if (
+        time.monotonic() - checked_at
+        < settings.CATALOGUE_VERSION_CHECK_SECONDS
+    ):
+        return version
+    return None
+
+
+def remember_version(version):
+    global _checked
+    _checked = (version, time.monotonic())
+    return version
+
+
+def get_catalogue_version():
+    version = get_checked_version()
+    if version is not None:
+        return version
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        return bump_catalogue_version()
+    return remember_version(version)
+
+
+async def aget_catalogue_version():
+    """Версия справочника или None, если ее еще нет в кэше."""
+    version = get_checked_version()
+    if version is not None:
+        return version
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        return None
+    return remember_version(version)
+
+
+def bump_catalogue_version():
+    """Объявляет справочник измененным: кэши процессов будут пересобраны."""
+    version = uuid.uuid4().hex
+    cache.set(VERSION_KEY, version, timeout=None)
+    return remember_version(version)
+
+
+class CatalogueCache:
+    """Значение, которое вычисляется один раз на версию справочника."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cached = (None, None)
+
+    def build(self):
+        raise NotImplementedError
+
+    def get(self):
+        version = get_catalogue_version()
+        cached_version, value = self._cached
+        record_cache(type(self).__name__, cached_version == version)
+        if cached_version != version:
+            with self._lock:
+                cached_version, value = self._cached
+                if cached_version != version:
+                    value = self.build()
+                    self._cached = (version, value)
+        return value
+
+    async def aget(self):
+        """get() для асинхронных представлений.
+
+        Актуальное значение возвращается без перехода в поток; сборка
+        после смены версии идет в потоке, как в get().
+        """
+        version = await aget_catalogue_version()
+        cached_version, value = self._cached
+        if version is None or cached_version != version:
+            return await sync_to_async(self.get)()
+        record_cache(type(self).__name__, True)
+        return value
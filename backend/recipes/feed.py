@@ -0,0 +1,121 @@
+"""Лента рецептов: рассылка при публикации и чтение для подписчика."""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Q, Subquery
+
+from users.models import User
+
+from .models import FeedItem, Recipe, Subscription
+
+
+def is_fan_out_author(author):
+    """Рассылаются ли рецепты автора в ленты подписчиков при записи.
+
+    Рецепты авторов с очень большим числом подписчиков не копируются
+    в ленты, а подмешиваются при чтении. Режим хранится у автора и
+    не возвращается назад: рецепты, опубликованные без рассылки,
+    иначе пропали бы из лент после отписок.
+    """
+    return not author.feed_fan_in
+
+
+def update_feed_mode(author_id):
+    """Переводит автора в режим без рассылки при росте числа подписчиков."""
+    User.objects.filter(
+        pk=author_id,
+        feed_fan_in=False,
+        subscribers_count__gt=settings.FEED_FAN_OUT_MAX_FOLLOWERS,
+    ).update(feed_fan_in=True)
+
+
+def fan_out_recipe(recipe):
+    """Добавляет рецепт в ленты всех подписчиков автора пачками."""
+    if not is_fan_out_author(recipe.author):
+        return
+    followers = (
+        Subscription.objects.filter(author=recipe.author_id)
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=settings.FEED_BATCH_SIZE)
+    )
+    batch = []
+    for user_id in followers:
+        batch.append(
+            FeedItem(user_id=user_id, recipe=recipe, pub_date=recipe.pub_date)
+        )
+        if len(batch) >= settings.FEED_BATCH_SIZE:
+            FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fill_feeds(subscriptions):
+    """Добавляет в ленты новые рецепты авторов по парам (user_id, author_id).
+
+    Лимит FEED_BACKFILL_SIZE действует для каждого автора; рецепты
+    всех авторов читаются одним запросом. Авторы без рассылки
+    пропускаются.
+    """
+    subscriptions = list(subscriptions)
+    latest = Recipe.objects.filter(author=OuterRef('author')).values('pk')
+    recipes = Recipe.objects.filter(
+        author_id__in={author_id for _, author_id in subscriptions},
+        author__feed_fan_in=False,
+        pk__in=Subquery(latest[:settings.FEED_BACKFILL_SIZE]),
+    ).values_list('author_id', 'id', 'pub_date')
+    by_author = defaultdict(list)
+    for author_id, recipe_id, pub_date in recipes:
+        by_author[author_id].append((recipe_id, pub_date))
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for user_id, author_id in subscriptions
+            for recipe_id, pub_date in by_author[author_id]
+        ],
+        ignore_conflicts=True,
+        batch_size=settings.FEED_BATCH_SIZE,
+    )
+
+
+def clear_feed(user_id, author_id):
+    """Удаляет рецепты автора из ленты после отписки от него."""
+    FeedItem.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def get_fan_in_authors(user):
+    return Subscription.objects.filter(
+        user=user, author__feed_fan_in=True
+    ).values('author')
+
+
+def filter_feed(user, queryset, fan_in_authors, has_fan_in_authors):
+    if not has_fan_in_authors:
+        return queryset.filter(feed_items__user=user).annotate(
+            feed_date=F('feed_items__pub_date')
+        )
+    feed = FeedItem.objects.filter(user=user).values('recipe')
+    return queryset.filter(
+        Q(pk__in=Subquery(feed)) | Q(author__in=Subquery(fan_in_authors))
+    ).annotate(feed_date=F('pub_date'))
+
+
+def get_feed(user, queryset):
+    """Рецепты ленты пользователя с датой ленты в аннотации feed_date.
+
+    Обычно лента читается одним диапазонным сканом по индексу
+    (user, -pub_date); рецепты авторов без рассылки подмешиваются
+    при чтении.
+    """
+    fan_in_authors = get_fan_in_authors(user)
+    return filter_feed(user, queryset, fan_in_authors, fan_in_authors.exists())
+
+
+async def aget_feed(user, queryset):
+    """get_feed() для асинхронных представлений."""
+    fan_in_authors = get_fan_in_authors(user)
+    return filter_feed(
+        user, queryset, fan_in_authors, await fan_in_authors.aexists()
+    )
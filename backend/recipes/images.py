@@ -0,0 +1,100 @@
+"""Фоновое создание уменьшенных копий изображений рецептов."""
+
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions'
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {
+        'format': 'JPEG',
+        'quality': 85,
+        'optimize': True,
+        'progressive': True,
+    },
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-images',
+)
+
+
+def render_image(source):
+    """Копии изображения без EXIF для каждой ширины и формата.
+
+    Возвращает словарь {ширина: {формат: байты}}. Ширины больше исходной
+    пропускаются, кроме самой маленькой.
+    """
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    widths = sorted(settings.RECIPE_IMAGE_WIDTHS)
+    renditions = {}
+    for width in widths:
+        if width > image.width and width != widths[0]:
+            break
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        renditions[width] = {}
+        for name, options in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, **options)
+            renditions[width][name] = buffer.getvalue()
+    return renditions
+
+
+def make_renditions(recipe_id):
+    """Создает копии изображения рецепта и сохраняет их пути в рецепте."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    name = recipe.image.name
+    with recipe.image.open('rb') as source:
+        rendered = render_image(source)
+    paths = {}
+    for width, files in rendered.items():
+        paths[str(width)] = {
+            file_format: default_storage.save(
+                f'{RENDITIONS_DIR}/{width}.{file_format}',
+                ContentFile(content),
+            )
+            for file_format, content in files.items()
+        }
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_renditions=paths
+    )
+
+
+def _make_renditions_in_background(recipe_id):
+    close_old_connections()
+    try:
+        make_renditions(recipe_id)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(recipe):
+    """Ставит обработку изображения в очередь после фиксации транзакции.
+
+    Копии прежнего изображения сбрасываются сразу: save() рецепта поле
+    image_renditions не записывает.
+    """
+    recipe.image_renditions = {}
+    if recipe.pk is not None:
+        Recipe.objects.filter(pk=recipe.pk).update(image_renditions={})
+    transaction.on_commit(
+        lambda: executor.submit(_make_renditions_in_background, recipe.pk)
+    )
@@ -0,0 +1,396 @@
+"""Скрипт для замера времени ответа API на текущих данных."""
+
+import base64
+import io
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from api import urls
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            Subscription, Tag)
+from users.models import User
+
+TEMP_PASSWORD = 'Lemon-harbor-42'
+NEW_PASSWORD = 'Copper-meadow-17'
+# Маршруты, которые нельзя вызывать без порчи данных.
+SKIPPED_ROUTES = {
+    'favorite-detail': 'DELETE удаляет сам рецепт, а не запись избранного',
+}
+
+
+def get_route_names(patterns=urls.urlpatterns, prefix=''):
+    """Имена всех достижимых маршрутов api/urls.py.
+
+    Маршруты, перекрытые более ранними с тем же шаблоном, пропускаются.
+    """
+    seen = set()
+    names = []
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            route = prefix + str(pattern.pattern)
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, route)
+            elif route not in seen:
+                seen.add(route)
+                if pattern.name not in names:
+                    names.append(pattern.name)
+
+    walk(patterns, prefix)
+    return names
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, round(percent / 100 * len(values) + 0.5) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (90, 160, 60)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@contextmanager
+def no_throttling():
+    throttle_classes = APIView.throttle_classes
+    APIView.throttle_classes = ()
+    try:
+        yield
+    finally:
+        APIView.throttle_classes = throttle_classes
+
+
+def get_scenarios(data):
+    """Шаги замера: (маршрут, клиент, метод, путь, тело запроса).
+
+    Путь и тело могут быть функциями от состояния итерации, чтобы шаги
+    создания и удаления работали с одним объектом. Запросы на запись
+    выполняет временный пользователь temp, пользователь user только
+    читает.
+    """
+    recipe = f'/api/recipes/{data["recipe"]}/'
+    other = data['other_recipe']
+    bulk = {'ids': [other]}
+    recipe_data = {
+        'name': 'Замер',
+        'text': 'Рецепт для замера',
+        'cooking_time': 10,
+        'tags': [data['tag']],
+        'ingredients': [{'id': data['ingredient'], 'amount': 10}],
+        'image': make_image(),
+    }
+
+    def new_user(state):
+        number = state['iteration']
+        return {
+            'username': f'{data["new_user_prefix"]}{number}',
+            'email': f'{data["new_user_prefix"]}{number}@example.com',
+            'first_name': 'Замер',
+            'last_name': 'Замеров',
+            'password': TEMP_PASSWORD,
+        }
+
+    def created_recipe(state):
+        return f'/api/recipes/{state["created"]}/'
+
+    created_recipe.label = '/api/recipes/{id}/'
+
+    def login_token(state):
+        return state['token']
+
+    return [
+        ('api-root', 'user', 'get', '/api/', None),
+        ('users-list', 'user', 'get', '/api/users/?limit=6', None),
+        ('users-list', 'anon', 'post', '/api/users/', new_user),
+        ('users-me', 'user', 'get', '/api/users/me/', None),
+        ('users-detail', 'user', 'get',
+         f'/api/users/{data["author"]}/', None),
+        ('users-subscriptions', 'user', 'get',
+         '/api/users/subscriptions/?recipes_limit=3', None),
+        ('users-subscribe', 'temp', 'post',
+         f'/api/users/{data["other_author"]}/subscribe/', None),
+        ('users-subscribe', 'temp', 'delete',
+         f'/api/users/{data["other_author"]}/subscribe/', None),
+        ('users-set-password', 'temp', 'post', '/api/users/set_password/',
+         {'new_password': NEW_PASSWORD, 'current_password': TEMP_PASSWORD}),
+        ('users-set-password', 'temp', 'post', '/api/users/set_password/',
+         {'new_password': TEMP_PASSWORD, 'current_password': NEW_PASSWORD}),
+        ('users-set-username', 'temp', 'post', '/api/users/set_email/',
+         {'new_email': 'new@example.com', 'current_password': 'wrong'}),
+        ('users-activation', 'anon', 'post', '/api/users/activation/',
+         {'uid': 'x', 'token': 'x'}),
+        ('users-resend-activation', 'anon', 'post',
+         '/api/users/resend_activation/', {'email': data['temp_email']}),
+        ('users-reset-password', 'anon', 'post',
+         '/api/users/reset_password/', {'email': data['temp_email']}),
+        ('users-reset-password-confirm', 'anon', 'post',
+         '/api/users/reset_password_confirm/',
+         {'uid': 'x', 'token': 'x', 'new_password': TEMP_PASSWORD}),
+        ('users-reset-username', 'anon', 'post',
+         '/api/users/reset_email/', {'email': data['temp_email']}),
+        ('users-reset-username-confirm', 'anon', 'post',
+         '/api/users/reset_email_confirm/',
+         {'uid': 'x', 'token': 'x', 'new_email': 'new@example.com'}),
+        ('tags-list', 'user', 'get', '/api/tags/', None),
+        ('tags-detail', 'user', 'get', f'/api/tags/{data["tag"]}/', None),
+        ('ingredients-list', 'user', 'get', '/api/ingredients/', None),
+        ('ingredients-list', 'user', 'get',
+         f'/api/ingredients/?name={data["ingredient_prefix"]}', None),
+        ('ingredients-detail', 'user', 'get',
+         f'/api/ingredients/{data["ingredient"]}/', None),
+        ('recipes-list', 'anon', 'get', '/api/recipes/?limit=6', None),
+        ('recipes-list', 'user', 'get', '/api/recipes/?limit=6', None),
+        ('recipes-list', 'user', 'get',
+         f'/api/recipes/?limit=6&tags={data["tag_slug"]}', None),
+        ('recipes-list', 'user', 'get',
+         f'/api/recipes/?limit=6&author={data["author"]}', None),
+        ('recipes-list', 'user', 'get',
+         '/api/recipes/?limit=6&is_favorited=1', None),
+        ('recipes-list', 'user', 'get',
+         '/api/recipes/?limit=6&is_in_shopping_cart=1', None),
+        ('recipes-list', 'user', 'get',
+         '/api/recipes/?limit=6&paginate=cursor', None),
+        ('recipes-detail', 'user', 'get', recipe, None),
+        ('recipes-feed', 'user', 'get', '/api/recipes/feed/?limit=6', None),
+        ('recipes-download-shopping-cart', 'user', 'get',
+         '/api/recipes/download_shopping_cart/?format=txt', None),
+        ('recipes-download-shopping-cart', 'user', 'get',
+         '/api/recipes/download_shopping_cart/?format=csv', None),
+        ('recipes-download-shopping-cart', 'user', 'get',
+         '/api/recipes/download_shopping_cart/', None),
+        ('recipes-list', 'temp', 'post', '/api/recipes/', recipe_data),
+        ('recipes-detail', 'temp', 'patch', created_recipe,
+         {'name': 'Замер 2', 'cooking_time': 20}),
+        ('recipes-detail', 'temp', 'delete', created_recipe, None),
+        ('favorite-list', 'temp', 'post',
+         f'/api/recipes/{other}/favorite/', None),
+        ('favorite-list', 'temp', 'delete',
+         f'/api/recipes/{other}/favorite/', None),
+        ('shopping_cart-list', 'user', 'get',
+         f'/api/recipes/{other}/shopping_cart/?limit=6', None),
+        ('shopping_cart-list', 'temp', 'post',
+         f'/api/recipes/{other}/shopping_cart/', None),
+        ('shopping_cart-list', 'temp', 'delete',
+         f'/api/recipes/{other}/shopping_cart/', None),
+        ('shopping_cart-detail', 'user', 'get',
+         f'/api/recipes/{other}/shopping_cart/{other}/', None),
+        ('favorite-bulk', 'temp', 'post', '/api/recipes/favorite/', bulk),
+        ('favorite-bulk', 'temp', 'put', '/api/recipes/favorite/', bulk),
+        ('favorite-bulk', 'temp', 'delete', '/api/recipes/favorite/', bulk),
+        ('shopping_cart-bulk', 'temp', 'post',
+         '/api/recipes/shopping_cart/', bulk),
+        ('shopping_cart-bulk', 'temp', 'put',
+         '/api/recipes/shopping_cart/', bulk),
+        ('shopping_cart-bulk', 'temp', 'delete',
+         '/api/recipes/shopping_cart/', bulk),
+        ('login', 'anon', 'post', '/api/auth/token/login/',
+         {'email': data['temp_email'], 'password': TEMP_PASSWORD}),
+        ('logout', login_token, 'post', '/api/auth/token/logout/', None),
+    ]
+
+
+class Command(BaseCommand):
+    """Замер производительности API."""
+
+    help = (
+        'Обходит все маршруты api/urls.py тестовым клиентом и выводит в '
+        'JSON задержку p50/p95/p99, число запросов к базе и размер ответа. '
+        'Чтение замеряется от имени существующего пользователя, запись - '
+        'от имени пользователя, созданного на время замера; он и все '
+        'созданные им объекты затем удаляются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Число прогонов без учета в результатах',
+        )
+        parser.add_argument(
+            '--user',
+            help='Логин пользователя для замеров, по умолчанию '
+            'пользователь с самым большим списком покупок',
+        )
+        parser.add_argument(
+            '--output', default='-', help='Файл для результатов'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        user = self.get_user(options['user'])
+        # Имена уникальны для запуска: удаляются только свои пользователи
+        username = f'benchmark_{uuid.uuid4().hex[:12]}'
+        temp = User.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            password=TEMP_PASSWORD,
+            first_name='Замер',
+            last_name='Замеров',
+        )
+        new_user_prefix = f'{username}_new_'
+        try:
+            with no_throttling(), override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                ALLOWED_HOSTS=['*'],
+            ):
+                results = self.run(user, temp, new_user_prefix, options)
+        finally:
+            # Рецепты, подписки, избранное и токены удаляются каскадом
+            temp.delete()
+            User.objects.filter(username__startswith=new_user_prefix).delete()
+        covered = {result['route'] for result in results.values()}
+        report = {
+            'iterations': options['iterations'],
+            'user': user.username,
+            'data': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'favorites': Favorite.objects.count(),
+                'shopping_carts': ShoppingCart.objects.count(),
+                'subscriptions': Subscription.objects.count(),
+            },
+            'skipped': SKIPPED_ROUTES,
+            'not_covered': [
+                name for name in get_route_names()
+                if name not in covered and name not in SKIPPED_ROUTES
+            ],
+            'routes': results,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(output)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.annotate(
+                carts=Count('shoppingcart')
+            ).order_by('-carts', 'pk').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователя для замеров, заполните базу '
+                'командой generate_data'
+            )
+        return user
+
+    def get_data(self, user, temp, new_user_prefix):
+        recipe = Recipe.objects.filter(author=user).first()
+        if recipe is None:
+            recipe = Recipe.objects.first()
+        other_recipe = Recipe.objects.exclude(author=temp).first()
+        other_author = User.objects.filter(
+            recipes_count__gt=0
+        ).exclude(pk=temp.pk).first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if None in (recipe, other_recipe, other_author, tag, ingredient):
+            raise CommandError(
+                'Недостаточно данных для замеров, заполните базу '
+                'командой generate_data'
+            )
+        return {
+            'recipe': recipe.pk,
+            'author': recipe.author_id,
+            'other_recipe': other_recipe.pk,
+            'other_author': other_author.pk,
+            'tag': tag.pk,
+            'tag_slug': tag.slug,
+            'ingredient': ingredient.pk,
+            'ingredient_prefix': ingredient.name[:2],
+            'temp_email': temp.email,
+            'new_user_prefix': new_user_prefix,
+        }
+
+    def request(self, client, method, path, body):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, body, format='json')
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            elapsed = time.perf_counter() - started
+        return response, elapsed, len(queries.captured_queries), size
+
+    def run(self, user, temp, new_user_prefix, options):
+        data = self.get_data(user, temp, new_user_prefix)
+        clients = {
+            name: APIClient(raise_request_exception=False)
+            for name in ('anon', 'user', 'temp')
+        }
+        # Без токенов: вход по токену замеряют шаги login и logout,
+        # а токен пользователя user не создается
+        clients['user'].force_authenticate(user)
+        clients['temp'].force_authenticate(temp)
+        scenarios = get_scenarios(data)
+        samples = {}
+        iterations = options['warmup'] + options['iterations']
+        for iteration in range(iterations):
+            state = {'iteration': iteration}
+            for route, client, method, path, body in scenarios:
+                if callable(client):
+                    client_name = 'anon'
+                    client = APIClient(raise_request_exception=False)
+                    client.credentials(
+                        HTTP_AUTHORIZATION=f'Token {state["token"]}'
+                    )
+                else:
+                    client_name, client = client, clients[client]
+                label = f'{method.upper()} {getattr(path, "label", path)}'
+                path = path(state) if callable(path) else path
+                body = body(state) if callable(body) else body
+                response, elapsed, queries, size = self.request(
+                    client, method, path, body
+                )
+                if route == 'recipes-list' and method == 'post':
+                    state['created'] = response.data.get('id')
+                if route == 'login':
+                    state['token'] = response.data.get('auth_token')
+                if iteration < options['warmup']:
+                    continue
+                label = f'{label} ({client_name})'
+                sample = samples.setdefault(label, {
+                    'route': route,
+                    'status': set(),
+                    'times': [],
+                    'queries': [],
+                    'bytes': [],
+                })
+                sample['status'].add(response.status_code)
+                sample['times'].append(elapsed * 1000)
+                sample['queries'].append(queries)
+                sample['bytes'].append(size)
+            self.stderr.write(f'Итерация {iteration + 1} из {iterations}')
+        return {
+            label: {
+                'route': sample['route'],
+                'status': sorted(sample['status']),
+                'p50_ms': round(percentile(sample['times'], 50), 2),
+                'p95_ms': round(percentile(sample['times'], 95), 2),
+                'p99_ms': round(percentile(sample['times'], 99), 2),
+                'queries': max(sample['queries']),
+                'bytes': percentile(sample['bytes'], 50),
+            }
+            for label, sample in samples.items()
+        }
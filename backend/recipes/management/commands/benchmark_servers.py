@@ -0,0 +1,317 @@
+"""Скрипт для сравнения WSGI и ASGI режимов сервера под нагрузкой."""
+
+import base64
+import http.client
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+from recipes.management.commands.benchmark import TEMP_PASSWORD, percentile
+from recipes.models import Recipe
+from users.models import User
+
+MODES = ('wsgi', 'asgi')
+UPLOAD_CHUNK_SIZE = 64 * 1024
+STARTUP_TIMEOUT = 30
+
+
+def make_upload(width, height):
+    """Тело PATCH рецепта с несжимаемым изображением width x height."""
+    image = Image.frombytes(
+        'RGB', (width, height), os.urandom(width * height * 3)
+    )
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return json.dumps(
+        {
+            'image': 'data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode()
+        }
+    ).encode()
+
+
+def get_scenarios(user, temp, options):
+    """Запросы, которые большую часть времени ждут ввода-вывода.
+
+    Изображение загружается в копию рецепта временного пользователя.
+    """
+    scenarios = {
+        'ingredients autocomplete': (
+            user,
+            'GET',
+            '/api/ingredients/?'
+            + urlencode({'name': options['search'], 'limit': 10}),
+            None,
+        ),
+        'feed': (user, 'GET', '/api/recipes/feed/?limit=6', None),
+        'download txt': (
+            user,
+            'GET',
+            '/api/recipes/download_shopping_cart/?format=txt',
+            None,
+        ),
+        'download pdf': (
+            user,
+            'GET',
+            '/api/recipes/download_shopping_cart/?format=pdf',
+            None,
+        ),
+    }
+    recipe = user.recipes.order_by('pk').first()
+    if recipe is not None:
+        copy = Recipe.objects.create(
+            author=temp,
+            name=recipe.name,
+            image=recipe.image.name,
+            text=recipe.text,
+            cooking_time=recipe.cooking_time,
+        )
+        scenarios['image upload'] = (
+            temp,
+            'PATCH',
+            f'/api/recipes/{copy.pk}/',
+            make_upload(*options['image_size']),
+        )
+    return scenarios
+
+
+class Command(BaseCommand):
+    """Сравнение режимов сервера."""
+
+    help = (
+        'Запускает gunicorn в режимах wsgi (синхронные воркеры) и asgi '
+        '(воркеры uvicorn) с одинаковым числом воркеров и нагружает их '
+        'параллельными запросами к скачиванию списка покупок, загрузке '
+        'изображения, ленте и автодополнению ингредиентов. Медленных '
+        'клиентов имитирует --upload-delay-ms. Заполните базу командой '
+        'generate_data; сервер использует те же настройки окружения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes',
+            default=','.join(MODES),
+            help='Режимы через запятую',
+        )
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help='Число одновременных запросов',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Запросов на каждый сценарий',
+        )
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--user',
+            help='Логин пользователя, по умолчанию с самой большой корзиной',
+        )
+        parser.add_argument('--search', default='мол')
+        parser.add_argument(
+            '--image-size',
+            type=int,
+            nargs=2,
+            default=(800, 600),
+            metavar=('WIDTH', 'HEIGHT'),
+        )
+        parser.add_argument(
+            '--upload-delay-ms',
+            type=float,
+            default=10,
+            help='Пауза клиента между частями тела запроса по 64 КБ',
+        )
+        parser.add_argument(
+            '--output', help='Сохранить результаты в JSON-файл'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        modes = [mode for mode in options['modes'].split(',') if mode]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f'Неизвестные режимы: {", ".join(unknown)}')
+        user = self.get_user(options['user'])
+        # Имя уникально для запуска: удаляется только свой пользователь
+        username = f'benchmark_{uuid.uuid4().hex[:12]}'
+        temp = User.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            password=TEMP_PASSWORD,
+            first_name='Замер',
+            last_name='Замеров',
+        )
+        token, created = Token.objects.get_or_create(user=user)
+        tokens = {
+            user: token.key,
+            temp: Token.objects.create(user=temp).key,
+        }
+        results = {}
+        try:
+            scenarios = get_scenarios(user, temp, options)
+            for mode in modes:
+                self.stdout.write(f'{mode}: {options["workers"]} воркера')
+                results[mode] = self.run_mode(
+                    mode, scenarios, tokens, options
+                )
+                for name, result in results[mode].items():
+                    self.stdout.write(
+                        f'  {name:26} {result["rps"]:8} rps '
+                        f'p50 {result["p50_ms"]:8} '
+                        f'p95 {result["p95_ms"]:8} '
+                        f'p99 {result["p99_ms"]:8} мс, '
+                        f'ошибок {result["errors"]}'
+                    )
+        finally:
+            # Рецепт и токен временного пользователя удаляются каскадом
+            temp.delete()
+            if created:
+                token.delete()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {
+                        'workers': options['workers'],
+                        'concurrency': options['concurrency'],
+                        'requests': options['requests'],
+                        'upload_delay_ms': options['upload_delay_ms'],
+                        'results': results,
+                    },
+                    file,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.annotate(
+                carts=Count('shoppingcart')
+            ).order_by('-carts', 'pk').first()
+        if user is None:
+            raise CommandError('Нет пользователей, заполните базу')
+        return user
+
+    def start_server(self, mode, options):
+        env = dict(os.environ, SERVER_MODE=mode)
+        env.pop('ASYNC_VIEWS', None)
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                '-m',
+                'gunicorn',
+                '--bind',
+                f'127.0.0.1:{options["port"]}',
+                '--workers',
+                str(options['workers']),
+                '--log-level',
+                'warning',
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер {mode} не запустился')
+            try:
+                connection = http.client.HTTPConnection(
+                    '127.0.0.1', options['port'], timeout=1
+                )
+                connection.request('GET', '/api/tags/')
+                connection.getresponse().read()
+                connection.close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'Сервер {mode} не ответил за {STARTUP_TIMEOUT} с')
+
+    def run_mode(self, mode, scenarios, tokens, options):
+        server = self.start_server(mode, options)
+        try:
+            return {
+                name: self.run_scenario(
+                    user, tokens[user], *scenario, options
+                )
+                for name, (user, *scenario) in scenarios.items()
+            }
+        finally:
+            server.terminate()
+            server.wait()
+
+    def request(self, port, method, path, body, headers, delay):
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            connection.putrequest(method, path)
+            for header, value in headers.items():
+                connection.putheader(header, value)
+            if body is not None:
+                connection.putheader('Content-Type', 'application/json')
+                connection.putheader('Content-Length', str(len(body)))
+            connection.endheaders()
+            for start in range(0, len(body or b''), UPLOAD_CHUNK_SIZE):
+                time.sleep(delay)
+                connection.send(body[start:start + UPLOAD_CHUNK_SIZE])
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except OSError:
+            status = None
+        finally:
+            connection.close()
+        return time.perf_counter() - started, status
+
+    def run_scenario(self, user, token, method, path, body, options):
+        # Не упираться в лимиты DRF при повторных запусках
+        cache.delete_many(
+            [
+                UserRateThrottle.cache_format
+                % {'scope': 'user', 'ident': user.pk},
+                AnonRateThrottle.cache_format
+                % {'scope': 'anon', 'ident': '127.0.0.1'},
+            ]
+        )
+        headers = {'Authorization': f'Token {token}'}
+        delay = options['upload_delay_ms'] / 1000
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            samples = list(
+                pool.map(
+                    lambda _: self.request(
+                        options['port'], method, path, body, headers, delay
+                    ),
+                    range(options['requests']),
+                )
+            )
+        total = time.perf_counter() - started
+        times = [duration * 1000 for duration, _ in samples]
+        return {
+            'rps': round(len(samples) / total, 1),
+            'p50_ms': round(percentile(times, 50), 1),
+            'p95_ms': round(percentile(times, 95), 1),
+            'p99_ms': round(percentile(times, 99), 1),
+            'errors': sum(
+                1 for _, status in samples if status is None or status >= 400
+            ),
+        }
@@ -0,0 +1,57 @@
+"""Скрипт для проверки сумм ингредиентов в списках покупок."""
+
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cart import get_cart_amounts, rebuild_totals
+from recipes.models import CartIngredientTotal
+
+
+class Command(BaseCommand):
+    """Работа с базой данных."""
+
+    help = 'Проверка сумм ингредиентов в списках покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Пересчитать суммы пользователей с расхождениями',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in get_cart_amounts().iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in (
+                CartIngredientTotal.objects.values_list(
+                    'user', 'ingredient', 'amount'
+                ).iterator()
+            )
+        }
+        broken_users = sorted(
+            {
+                user_id
+                for user_id, ingredient_id in expected.keys() | stored.keys()
+                if expected.get((user_id, ingredient_id))
+                != stored.get((user_id, ingredient_id))
+            }
+        )
+        if not broken_users:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет!'))
+            return
+        message = (
+            'Расхождения у пользователей: '
+            f'{", ".join(map(str, broken_users))}'
+        )
+        if not options['fix']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
+        with transaction.atomic():
+            rebuild_totals(broken_users)
+        self.stdout.write(self.style.SUCCESS('Суммы пересчитаны!'))
@@ -0,0 +1,187 @@
+"""Скрипт для проверки планов запросов основных страниц API."""
+
+import json
+import re
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import TagRecipe
+from users.models import User
+
+# (адрес, разрешен ли полный проход для COUNT(*) нумерации страниц)
+REQUESTS = (
+    ('/api/recipes/?limit=6', True),
+    ('/api/recipes/?limit=6&paginate=cursor', False),
+    ('/api/recipes/?limit=6&paginate=cursor&author={author}', False),
+    ('/api/recipes/?limit=6&author={author}', False),
+    ('/api/recipes/?limit=6&tags={tag}', True),
+    ('/api/recipes/?limit=6&is_favorited=1', False),
+    ('/api/recipes/?limit=6&is_in_shopping_cart=1', False),
+    ('/api/recipes/feed/?limit=6', False),
+    ('/api/users/subscriptions/?limit=6&recipes_limit=3', False),
+    ('/api/recipes/download_shopping_cart/?format=txt', False),
+)
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)\b(?!.* USING (?:COVERING )?INDEX)')
+SQLITE_ALIAS = re.compile(r'"(\w+)" (\w+)\b')
+
+
+def get_postgresql_scans(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            yield node['Relation Name']
+        nodes.extend(node.get('Plans', ()))
+
+
+def get_sqlite_scans(sql):
+    aliases = dict(
+        (alias, table) for table, alias in SQLITE_ALIAS.findall(sql)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        rows = cursor.fetchall()
+    for row in rows:
+        match = SQLITE_SCAN.match(row[-1])
+        if match:
+            name = match.group(1)
+            yield aliases.get(name, name)
+
+
+SCANNERS = {
+    'postgresql': get_postgresql_scans,
+    'sqlite': get_sqlite_scans,
+}
+
+
+def get_table_rows(table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s', [table]
+            )
+        else:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}'
+            )
+        row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+class Command(BaseCommand):
+    """Проверка планов запросов."""
+
+    help = (
+        'Выполняет основные запросы API на текущих данных, получает их '
+        'планы через EXPLAIN и завершается с ошибкой, если какой-то '
+        'запрос полностью просматривает большую таблицу. Заполните базу '
+        'командой generate_data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=10000,
+            help='Таблицы меньше этого размера можно просматривать целиком',
+        )
+        parser.add_argument(
+            '--user',
+            help='Логин пользователя, по умолчанию с самой большой корзиной',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Обновить статистику таблиц перед проверкой',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        scanner = SCANNERS.get(connection.vendor)
+        if scanner is None:
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается'
+            )
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        user = self.get_user(options['user'])
+        author = (
+            User.objects.filter(recipes_count__gt=0)
+            .order_by('-recipes_count')
+            .first()
+        )
+        tag = TagRecipe.objects.values_list('tag__slug', flat=True).first()
+        if author is None or tag is None:
+            raise CommandError('Нет рецептов с тегами, заполните базу')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.scanner = scanner
+        self.min_rows = options['min_rows']
+        self.tables = set(connection.introspection.table_names())
+        self.table_rows = {}
+        failures = []
+        errors = []
+        for template, allow_count in REQUESTS:
+            url = template.format(author=author.pk, tag=tag)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.stdout.write(
+                f'{url}: {response.status_code}, '
+                f'запросов {len(queries.captured_queries)}'
+            )
+            if not 200 <= response.status_code < 300:
+                errors.append(f'{url} ({response.status_code})')
+            if not self.check_queries(queries.captured_queries, allow_count):
+                failures.append(url)
+        if errors:
+            raise CommandError('Ошибочные ответы: ' + ', '.join(errors))
+        if failures:
+            raise CommandError(
+                'Полный просмотр больших таблиц: ' + ', '.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('Полных просмотров нет!'))
+
+    def check_queries(self, queries, allow_count):
+        passed = True
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            for table in set(self.scanner(sql)) & self.tables:
+                if table not in self.table_rows:
+                    self.table_rows[table] = get_table_rows(table)
+                if self.table_rows[table] < self.min_rows:
+                    continue
+                message = (
+                    f'  полный просмотр {table} '
+                    f'({self.table_rows[table]} строк): {sql[:200]}'
+                )
+                if allow_count and sql.startswith('SELECT COUNT(*)'):
+                    self.stdout.write(self.style.WARNING(message))
+                    continue
+                self.stdout.write(self.style.ERROR(message))
+                passed = False
+        return passed
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.annotate(
+                carts=Count('shoppingcart')
+            ).order_by('-carts', 'pk').first()
+        if user is None:
+            raise CommandError('Нет пользователей, заполните базу')
+        return user
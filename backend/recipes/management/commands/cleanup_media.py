@@ -0,0 +1,53 @@
+"""Скрипт для удаления изображений, на которые не ссылаются рецепты."""
+
+from datetime import timedelta
+from typing import Any, Optional
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.storage import get_referenced_files, walk_files
+
+MEDIA_DIR = 'recipes'
+
+
+class Command(BaseCommand):
+    """Очистка медиафайлов рецептов."""
+
+    help = 'Удаление изображений, на которые не ссылается ни один рецепт'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help='Не трогать файлы моложе указанного числа минут',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        try:
+            names = list(walk_files(default_storage, MEDIA_DIR))
+        except FileNotFoundError:
+            names = []
+        referenced = get_referenced_files()
+        deadline = timezone.now() - timedelta(minutes=options['min_age'])
+        removed = 0
+        for name in names:
+            if name in referenced:
+                continue
+            if default_storage.get_modified_time(name) > deadline:
+                continue
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+        self.stdout.write(
+            self.style.SUCCESS(f'Неиспользуемых файлов: {removed}')
+        )
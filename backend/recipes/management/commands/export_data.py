@@ -0,0 +1,179 @@
+"""Скрипт для выгрузки рецептов и данных пользователей в JSONL."""
+
+import base64
+import json
+import sys
+from typing import Any, Optional
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Subscription, Tag)
+from users.models import User
+
+
+def export_users(options):
+    fields = [
+        'username', 'email', 'first_name', 'last_name', 'is_active',
+        'is_staff', 'is_superuser', 'date_joined',
+    ]
+    if options['with_passwords']:
+        fields.append('password')
+    users = User.objects.order_by('pk').values(*fields)
+    for record in users.iterator(chunk_size=options['chunk_size']):
+        record['date_joined'] = record['date_joined'].isoformat()
+        yield record
+
+
+def export_tags(options):
+    tags = Tag.objects.order_by('pk').values('name', 'color', 'slug')
+    yield from tags.iterator(chunk_size=options['chunk_size'])
+
+
+def export_ingredients(options):
+    ingredients = Ingredient.objects.order_by('pk').values(
+        'name', 'measurement_unit'
+    )
+    yield from ingredients.iterator(chunk_size=options['chunk_size'])
+
+
+def export_recipes(options):
+    recipes = (
+        Recipe.objects.order_by('pk')
+        .select_related('author')
+        .prefetch_related(
+            'tags',
+            Prefetch(
+                'recipesingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+    )
+    for recipe in recipes.iterator(chunk_size=options['chunk_size']):
+        record = {
+            'author': recipe.author.username,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'pub_date': recipe.pub_date.isoformat(),
+            'image': recipe.image.name,
+            'image_renditions': recipe.image_renditions,
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                [
+                    amount.ingredient.name,
+                    amount.ingredient.measurement_unit,
+                    amount.amount,
+                ]
+                for amount in recipe.recipesingredients.all()
+            ],
+        }
+        if options['with_images'] and recipe.image:
+            with default_storage.open(recipe.image.name) as image:
+                record['image_content'] = base64.b64encode(
+                    image.read()
+                ).decode()
+            record['image_renditions'] = {}
+        yield record
+
+
+def export_recipe_links(model, date_field=None):
+    def export(options):
+        fields = [
+            'user__username',
+            'recipe__author__username',
+            'recipe__name',
+            'recipe__pub_date',
+        ]
+        if date_field:
+            fields.append(date_field)
+        rows = model.objects.order_by('pk').values_list(*fields)
+        for row in rows.iterator(chunk_size=options['chunk_size']):
+            record = {
+                'user': row[0],
+                'recipe': [row[1], row[2], row[3].isoformat()],
+            }
+            if date_field:
+                record[date_field] = row[4].isoformat()
+            yield record
+    return export
+
+
+def export_subscriptions(options):
+    subscriptions = Subscription.objects.order_by('pk').values_list(
+        'user__username', 'author__username', 'created'
+    )
+    for user, author, created in subscriptions.iterator(
+        chunk_size=options['chunk_size']
+    ):
+        yield {'user': user, 'author': author, 'created': created.isoformat()}
+
+
+EXPORTS = (
+    ('user', export_users),
+    ('tag', export_tags),
+    ('ingredient', export_ingredients),
+    ('recipe', export_recipes),
+    ('favorite', export_recipe_links(Favorite)),
+    ('shopping_cart', export_recipe_links(ShoppingCart, 'add_date')),
+    ('subscription', export_subscriptions),
+)
+
+
+class Command(BaseCommand):
+    """Работа с базой данных."""
+
+    help = (
+        'Выгрузка пользователей, тегов, ингредиентов, рецептов, избранного, '
+        'списков покупок и подписок в JSONL для команды import_data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для выгрузки, "-" для стандартного вывода'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из базы за один раз',
+        )
+        parser.add_argument(
+            '--with-images',
+            action='store_true',
+            help='Включить в выгрузку содержимое изображений рецептов',
+        )
+        parser.add_argument(
+            '--with-passwords',
+            action='store_true',
+            help='Выгрузить хэши паролей пользователей',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        path = options['path']
+        output = (
+            sys.stdout if path == '-'
+            else open(path, 'w', encoding='utf-8')
+        )
+        counts = {}
+        try:
+            for record_type, export in EXPORTS:
+                counts[record_type] = 0
+                for record in export(options):
+                    record['type'] = record_type
+                    output.write(json.dumps(record, ensure_ascii=False))
+                    output.write('\n')
+                    counts[record_type] += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(
+            'Выгружено: ' + ', '.join(
+                f'{record_type} {count}'
+                for record_type, count in counts.items()
+            )
+        ))
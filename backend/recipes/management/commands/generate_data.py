@@ -0,0 +1,276 @@
+"""Скрипт для заполнения базы синтетическими данными."""
+
+import io
+import itertools
+import random
+import time
+from datetime import timedelta
+from typing import Any, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.cart import rebuild_totals
+from recipes.catalogue import bump_catalogue_version
+from recipes.feed import fill_feeds
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Subscription, Tag, TagRecipe)
+from users.models import User
+
+WORDS = (
+    'суп', 'салат', 'пирог', 'запеканка', 'рагу', 'каша', 'омлет', 'паста',
+    'гуляш', 'плов', 'борщ', 'блины', 'котлеты', 'соус', 'десерт', 'хлеб',
+    'курица', 'говядина', 'рыба', 'грибы', 'сыр', 'томаты', 'картофель',
+    'тыква', 'яблоки', 'ягоды', 'шоколад', 'творог', 'рис', 'фасоль',
+)
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_power_law_weights(count, alpha):
+    """Накопленные веса распределения Ципфа для random.choices."""
+    return list(itertools.accumulate(
+        1 / rank ** alpha for rank in range(1, count + 1)
+    ))
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1280, 960), (210, 140, 70)).save(buffer, 'JPEG')
+    return default_storage.save(
+        'recipes/generated.jpg', ContentFile(buffer.getvalue())
+    )
+
+
+class Command(BaseCommand):
+    """Работа с базой данных."""
+
+    help = (
+        'Генерация пользователей, рецептов, избранного, списков покупок и '
+        'подписок. Число рецептов у авторов и популярность рецептов и '
+        'авторов подчиняются степенному закону'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--authors-share',
+            type=float,
+            default=0.2,
+            help='Доля пользователей, публикующих рецепты',
+        )
+        parser.add_argument(
+            '--max-recipes',
+            type=int,
+            default=200,
+            help='Число рецептов у самого активного автора',
+        )
+        parser.add_argument(
+            '--alpha',
+            type=float,
+            default=1.1,
+            help='Показатель степенного закона',
+        )
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--carts', type=int, default=5)
+        parser.add_argument('--subscriptions', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix',
+            default='user',
+            help='Префикс логинов создаваемых пользователей',
+        )
+
+    def log(self, message):
+        self.stdout.write(
+            f'{message} за {time.monotonic() - self.started:.1f} с'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        self.started = time.monotonic()
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix!r} уже есть, '
+                'укажите другой --prefix'
+            )
+        user_ids = self.create_users(prefix, options['users'])
+        tag_ids = self.create_tags(options['tags'])
+        ingredient_ids = self.get_ingredients()
+        authors_count = int(len(user_ids) * options['authors_share'])
+        authors = user_ids[:max(1, authors_count)]
+        recipe_ids = self.create_recipes(
+            authors, tag_ids, ingredient_ids, options
+        )
+        self.create_links(Favorite, user_ids, recipe_ids,
+                          options['favorites'], options['alpha'])
+        self.create_links(ShoppingCart, user_ids, recipe_ids,
+                          options['carts'], options['alpha'])
+        for chunk in chunks(user_ids, self.batch_size):
+            with transaction.atomic():
+                rebuild_totals(chunk)
+        self.log('Суммы списков покупок пересчитаны')
+        self.create_subscriptions(
+            user_ids, authors, options['subscriptions'], options['alpha']
+        )
+        call_command('recount', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: пользователей {len(user_ids)}, '
+            f'рецептов {len(recipe_ids)} '
+            f'за {time.monotonic() - self.started:.1f} с'
+        ))
+
+    def create_users(self, prefix, count):
+        password = make_password('password')
+        for chunk in chunks(range(count), self.batch_size):
+            User.objects.bulk_create(
+                User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    first_name=self.random.choice(WORDS).capitalize(),
+                    last_name=self.random.choice(WORDS).capitalize(),
+                    password=password,
+                )
+                for number in chunk
+            )
+        self.log(f'Пользователей создано: {count}')
+        return list(
+            User.objects.filter(username__startswith=prefix)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    def create_tags(self, count):
+        Tag.objects.bulk_create(
+            [
+                Tag(
+                    name=f'Тег {number}',
+                    color=f'#{self.random.randrange(0x1000000):06X}',
+                    slug=f'tag{number}',
+                )
+                for number in range(count)
+            ],
+            ignore_conflicts=True,
+        )
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def get_ingredients(self):
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'{word} {number}', measurement_unit='г')
+                for number, word in enumerate(WORDS * 20)
+            )
+            bump_catalogue_version()
+        return list(Ingredient.objects.values_list('pk', flat=True))
+
+    def create_recipes(self, authors, tag_ids, ingredient_ids, options):
+        image = make_image()
+        now = timezone.now()
+        counts = (
+            max(1, int(options['max_recipes'] / rank ** options['alpha']))
+            for rank in range(1, len(authors) + 1)
+        )
+        plan = (
+            author_id
+            for author_id, count in zip(authors, counts)
+            for _ in range(count)
+        )
+        recipe_ids = []
+        for chunk in chunks(plan, self.batch_size):
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        author_id=author_id,
+                        name=' '.join(self.random.sample(WORDS, 3)),
+                        text=' '.join(self.random.choices(WORDS, k=40)),
+                        cooking_time=self.random.randint(5, 180),
+                        image=image,
+                    )
+                    for author_id in chunk
+                )
+                for recipe in recipes:
+                    recipe.pub_date = now - timedelta(
+                        seconds=self.random.randrange(365 * 24 * 3600)
+                    )
+                Recipe.objects.bulk_update(recipes, ['pub_date'])
+                TagRecipe.objects.bulk_create(
+                    TagRecipe(recipe=recipe, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in self.random.sample(
+                        tag_ids, min(len(tag_ids), self.random.randint(1, 3))
+                    )
+                )
+                IngredientInRecipe.objects.bulk_create(
+                    IngredientInRecipe(
+                        recipe=recipe,
+                        ingredient_id=ingredient_id,
+                        amount=self.random.randint(1, 500),
+                    )
+                    for recipe in recipes
+                    for ingredient_id in self.random.sample(
+                        ingredient_ids,
+                        min(len(ingredient_ids), self.random.randint(3, 12)),
+                    )
+                )
+            recipe_ids.extend(recipe.pk for recipe in recipes)
+            self.log(f'Рецептов создано: {len(recipe_ids)}')
+        return recipe_ids
+
+    def pick(self, population, weights, average):
+        """Случайные элементы, популярные выбираются чаще."""
+        count = self.random.randint(0, 2 * average)
+        return set(self.random.choices(population, cum_weights=weights,
+                                       k=count))
+
+    def create_links(self, model, user_ids, recipe_ids, average, alpha):
+        popular = self.random.sample(recipe_ids, len(recipe_ids))
+        weights = get_power_law_weights(len(popular), alpha)
+        total = 0
+        for chunk in chunks(user_ids, self.batch_size):
+            links = [
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in chunk
+                for recipe_id in self.pick(popular, weights, average)
+            ]
+            model.objects.bulk_create(links, ignore_conflicts=True)
+            total += len(links)
+        self.log(f'{model._meta.verbose_name_plural}: {total}')
+
+    def create_subscriptions(self, user_ids, authors, average, alpha):
+        weights = get_power_law_weights(len(authors), alpha)
+        total = 0
+        for chunk in chunks(user_ids, self.batch_size):
+            subscriptions = [
+                (user_id, author_id)
+                for user_id in chunk
+                for author_id in self.pick(authors, weights, average)
+                if author_id != user_id
+            ]
+            with transaction.atomic():
+                Subscription.objects.bulk_create(
+                    [
+                        Subscription(user_id=user_id, author_id=author_id)
+                        for user_id, author_id in subscriptions
+                    ],
+                    ignore_conflicts=True,
+                )
+                fill_feeds(subscriptions)
+            total += len(subscriptions)
+        self.log(f'Подписок: {total}')
@@ -0,0 +1,336 @@
+"""Скрипт для загрузки рецептов и данных пользователей из JSONL."""
+
+import base64
+import json
+import os
+import posixpath
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes.cart import rebuild_totals
+from recipes.catalogue import bump_catalogue_version
+from recipes.feed import fill_feeds
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Subscription, Tag, TagRecipe)
+from users.models import User
+
+# Поля с auto_now_add, значения которых нужно сохранить из выгрузки.
+DATE_FIELDS = (
+    (Recipe, 'pub_date'),
+    (ShoppingCart, 'add_date'),
+    (Subscription, 'created'),
+)
+
+
+@contextmanager
+def keep_dates():
+    fields = [model._meta.get_field(name) for model, name in DATE_FIELDS]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def parse_date(value):
+    return parse_datetime(value) if value else timezone.now()
+
+
+def get_user_ids(usernames):
+    return dict(
+        User.objects.filter(username__in=set(usernames)).values_list(
+            'username', 'pk'
+        )
+    )
+
+
+def get_recipe_ids(keys):
+    """Id рецептов по ключам [автор, название, дата публикации]."""
+    keys = {(author, name, parse_date(date)) for author, name, date in keys}
+    recipes = Recipe.objects.filter(
+        author__username__in={key[0] for key in keys},
+        pub_date__in={key[2] for key in keys},
+    ).values_list('author__username', 'name', 'pub_date', 'pk')
+    return {
+        (author, name, pub_date): pk
+        for author, name, pub_date, pk in recipes
+        if (author, name, pub_date) in keys
+    }
+
+
+def load_users(records):
+    User.objects.bulk_create(
+        [
+            User(
+                username=record['username'],
+                email=record['email'],
+                first_name=record['first_name'],
+                last_name=record['last_name'],
+                password=record.get('password') or make_password(None),
+                is_active=record.get('is_active', True),
+                is_staff=record.get('is_staff', False),
+                is_superuser=record.get('is_superuser', False),
+                date_joined=parse_date(record.get('date_joined')),
+            )
+            for record in records
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def load_tags(records):
+    Tag.objects.bulk_create(
+        [
+            Tag(name=record['name'], color=record['color'],
+                slug=record['slug'])
+            for record in records
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def load_ingredients(records):
+    Ingredient.objects.bulk_create(
+        [
+            Ingredient(
+                name=record['name'],
+                measurement_unit=record['measurement_unit'],
+            )
+            for record in records
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def load_image(record):
+    if not record.get('image_content'):
+        return record.get('image', '')
+    return default_storage.save(
+        posixpath.join('recipes', posixpath.basename(record['image'])),
+        ContentFile(base64.b64decode(record['image_content'])),
+    )
+
+
+def load_recipes(records):
+    """Добавляет рецепты, которых еще нет, вместе с тегами и продуктами."""
+    author_ids = get_user_ids(record['author'] for record in records)
+    existing = get_recipe_ids(
+        (record['author'], record['name'], record['pub_date'])
+        for record in records
+    )
+    new = {}
+    for record in records:
+        key = (record['author'], record['name'],
+               parse_date(record['pub_date']))
+        if key not in existing and record['author'] in author_ids:
+            new[key] = record
+    recipes = Recipe.objects.bulk_create(
+        [
+            Recipe(
+                author_id=author_ids[record['author']],
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                pub_date=parse_date(record['pub_date']),
+                image=load_image(record),
+                image_renditions=(
+                    {} if record.get('image_content')
+                    else record.get('image_renditions', {})
+                ),
+            )
+            for record in new.values()
+        ]
+    )
+    records = list(new.values())
+    tag_ids = dict(
+        Tag.objects.filter(
+            slug__in={slug for record in records for slug in record['tags']}
+        ).values_list('slug', 'pk')
+    )
+    ingredient_ids = {
+        (name, measurement_unit): pk
+        for name, measurement_unit, pk in Ingredient.objects.filter(
+            name__in={
+                name for record in records
+                for name, _, _ in record['ingredients']
+            }
+        ).values_list('name', 'measurement_unit', 'pk')
+    }
+    TagRecipe.objects.bulk_create(
+        [
+            TagRecipe(recipe=recipe, tag_id=tag_ids[slug])
+            for recipe, record in zip(recipes, records)
+            for slug in set(record['tags'])
+            if slug in tag_ids
+        ],
+        ignore_conflicts=True,
+    )
+    IngredientInRecipe.objects.bulk_create(
+        [
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_ids[name, measurement_unit],
+                amount=amount,
+            )
+            for recipe, record in zip(recipes, records)
+            for name, measurement_unit, amount in record['ingredients']
+            if (name, measurement_unit) in ingredient_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def load_recipe_links(model, date_field=None):
+    def load(records):
+        user_ids = get_user_ids(record['user'] for record in records)
+        recipe_ids = get_recipe_ids(record['recipe'] for record in records)
+        objects = []
+        for record in records:
+            author, name, date = record['recipe']
+            recipe_id = recipe_ids.get((author, name, parse_date(date)))
+            if record['user'] not in user_ids or recipe_id is None:
+                continue
+            fields = {}
+            if date_field:
+                fields[date_field] = parse_date(record.get(date_field))
+            objects.append(model(
+                user_id=user_ids[record['user']], recipe_id=recipe_id,
+                **fields
+            ))
+        model.objects.bulk_create(objects, ignore_conflicts=True)
+        return {obj.user_id for obj in objects}
+    return load
+
+
+def load_shopping_carts(records):
+    rebuild_totals(load_recipe_links(ShoppingCart, 'add_date')(records))
+
+
+def load_subscriptions(records):
+    user_ids = get_user_ids(
+        username for record in records
+        for username in (record['user'], record['author'])
+    )
+    subscriptions = {
+        (user_ids[record['user']], user_ids[record['author']]):
+            parse_date(record.get('created'))
+        for record in records
+        if record['user'] in user_ids and record['author'] in user_ids
+        and record['user'] != record['author']
+    }
+    Subscription.objects.bulk_create(
+        [
+            Subscription(user_id=user_id, author_id=author_id, created=date)
+            for (user_id, author_id), date in subscriptions.items()
+        ],
+        ignore_conflicts=True,
+    )
+    fill_feeds(subscriptions)
+
+
+LOADERS = {
+    'user': load_users,
+    'tag': load_tags,
+    'ingredient': load_ingredients,
+    'recipe': load_recipes,
+    'favorite': load_recipe_links(Favorite),
+    'shopping_cart': load_shopping_carts,
+    'subscription': load_subscriptions,
+}
+
+
+class Command(BaseCommand):
+    """Работа с базой данных."""
+
+    help = (
+        'Загрузка выгрузки export_data. Данные добавляются пакетами в '
+        'отдельных транзакциях; номер последней сохраненной строки '
+        'пишется в файл <path>.progress, и прерванная загрузка '
+        'продолжается с него. Уже существующие записи пропускаются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки JSONL')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько записей сохранять в одной транзакции',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать загрузку с начала файла',
+        )
+
+    def read_progress(self, progress_path):
+        if not os.path.exists(progress_path):
+            return 0
+        with open(progress_path, encoding='utf-8') as file:
+            return int(file.read() or 0)
+
+    def write_progress(self, progress_path, line):
+        with open(f'{progress_path}.tmp', 'w', encoding='utf-8') as file:
+            file.write(str(line))
+        os.replace(f'{progress_path}.tmp', progress_path)
+
+    def flush(self, record_type, batch, line):
+        if not batch:
+            return
+        with transaction.atomic():
+            LOADERS[record_type](batch)
+        self.write_progress(self.progress_path, line)
+        self.loaded.add(record_type)
+        self.stdout.write(
+            f'Строка {line}: {record_type} +{len(batch)} '
+            f'за {time.monotonic() - self.started:.1f} с'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        path = options['path']
+        batch_size = options['batch_size']
+        self.progress_path = f'{path}.progress'
+        self.started = time.monotonic()
+        self.loaded = set()
+        done = 0 if options['restart'] else self.read_progress(
+            self.progress_path
+        )
+        if done:
+            self.stdout.write(f'Продолжение загрузки со строки {done + 1}')
+        line = done
+        batch, record_type = [], None
+        with keep_dates(), open(path, encoding='utf-8') as file:
+            for line, text in enumerate(file, 1):
+                if line <= done or not text.strip():
+                    continue
+                record = json.loads(text)
+                if record.get('type') not in LOADERS:
+                    raise CommandError(
+                        f'Строка {line}: неизвестный тип записи '
+                        f'{record.get("type")!r}'
+                    )
+                if record['type'] != record_type or len(batch) >= batch_size:
+                    self.flush(record_type, batch, line - 1)
+                    batch, record_type = [], record['type']
+                batch.append(record)
+            self.flush(record_type, batch, line)
+        if 'ingredient' in self.loaded:
+            bump_catalogue_version()
+        call_command('recount', stdout=self.stdout)
+        if os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка завершена за {time.monotonic() - self.started:.1f} с'
+        ))
@@ -1,31 +1,124 @@
 """Скрипт для заполнения базы данных ингредиетов."""
 
+import csv
 import json
+import os
+import time
 from typing import Any, Optional
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
+from recipes.catalogue import bump_catalogue_version
 from recipes.models import Ingredient
 
-JSON_PATH = './data/ingredients.json'
+JSON_PATH = os.path.join(settings.BASE_DIR, 'data', 'ingredients.json')
+READ_SIZE = 64 * 1024
+
+
+def read_json(file):
+    """Построчно читает объекты из JSON-массива, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise CommandError('Ожидается JSON-массив ингредиентов')
+            buffer = buffer[1:].lstrip()
+            started = True
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if started and buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Файл ингредиентов поврежден')
+            chunk = file.read(READ_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item['name'], item['measurement_unit']
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            name, measurement_unit = row
+            yield name, measurement_unit
+
+
+READERS = {
+    '.json': read_json,
+    '.csv': read_csv,
+}
 
 
 class Command(BaseCommand):
     """Работа с базой данных."""
 
-    help = 'Загрузка данных из файла ingredients.json'
+    help = (
+        'Загрузка ингредиентов из файла ingredients.json или .csv. '
+        'Уже существующие ингредиенты пропускаются, поэтому команду '
+        'можно запускать повторно для обновления справочника'
+    )
 
-    def handle(self, *args: Any, **options: Any) -> Optional[str]:
-        if Ingredient.objects.exists():
-            print('Данные уже загружены!')
-            return
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=JSON_PATH,
+            help='Путь к файлу ингредиентов (.json или .csv)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько ингредиентов добавлять за один запрос',
+        )
 
-        with open(JSON_PATH, encoding='utf-8') as json_file:
-            ingredients = json.load(json_file)
-            for ingredient in ingredients:
-                name = ingredient['name']
-                measurement_unit = ingredient['measurement_unit']
-                Ingredient.objects.create(
-                    name=name, measurement_unit=measurement_unit
-                )
-        print('Ингредиенты загружены в базу!')
+    def load(self, batch):
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in batch
+            ],
+            ignore_conflicts=True,
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .json и .csv')
+        batch_size = options['batch_size']
+        count_before = Ingredient.objects.count()
+        started = time.monotonic()
+        processed = 0
+        batch = []
+        with open(path, encoding='utf-8', newline='') as file:
+            for name, measurement_unit in reader(file):
+                batch.append((name.strip(), measurement_unit.strip()))
+                if len(batch) == batch_size:
+                    self.load(batch)
+                    processed += len(batch)
+                    batch = []
+                    self.stdout.write(
+                        f'Обработано {processed} строк '
+                        f'за {time.monotonic() - started:.2f} с'
+                    )
+        if batch:
+            self.load(batch)
+            processed += len(batch)
+        created = Ingredient.objects.count() - count_before
+        if created:
+            bump_catalogue_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {processed}, добавлено ингредиентов: '
+            f'{created} за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,32 @@
+"""Скрипт для создания уменьшенных копий изображений рецептов."""
+
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import make_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Работа с изображениями рецептов."""
+
+    help = 'Создание уменьшенных копий изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для уже обработанных рецептов',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_renditions={})
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+        for recipe_id in recipe_ids:
+            make_renditions(recipe_id)
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано изображений: {len(recipe_ids)}')
+        )
@@ -0,0 +1,70 @@
+"""Скрипт для переноса медиафайлов из MEDIA_ROOT в текущее хранилище."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.storage import get_local_storage, get_referenced_files
+
+
+class Command(BaseCommand):
+    """Перенос изображений рецептов."""
+
+    help = (
+        'Перенос изображений рецептов из MEDIA_ROOT в хранилище '
+        'DEFAULT_FILE_STORAGE. Уже перенесенные файлы пропускаются, '
+        'поэтому прерванный перенос можно запустить снова'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько файлов переносить за один пакет',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Число параллельных загрузок',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Удалять локальные файлы после переноса',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        source = get_local_storage()
+        if settings.DEFAULT_FILE_STORAGE == settings.MEDIA_STORAGES['local']:
+            raise CommandError(
+                'Медиафайлы уже хранятся локально, укажите MEDIA_STORAGE'
+            )
+        names = sorted(
+            name for name in get_referenced_files() if source.exists(name)
+        )
+        batch_size = options['batch_size']
+        started = time.monotonic()
+
+        def copy(name):
+            with source.open(name) as content:
+                default_storage.copy(name, content)
+            if options['delete']:
+                source.delete(name)
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for start in range(0, len(names), batch_size):
+                batch = names[start:start + batch_size]
+                list(executor.map(copy, batch))
+                self.stdout.write(
+                    f'Перенесено {start + len(batch)} из {len(names)} '
+                    f'за {time.monotonic() - started:.1f} с'
+                )
+        self.stdout.write(
+            self.style.SUCCESS(f'Перенесено файлов: {len(names)}')
+        )
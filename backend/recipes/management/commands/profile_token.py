@@ -0,0 +1,32 @@
+"""Скрипт для выдачи токена профилирования запросов."""
+
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.profiling import make_profile_token
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Работа с профилированием."""
+
+    help = (
+        'Выдает сотруднику токен для заголовка X-Profile, включающий '
+        'профилирование его запросов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        user = User.objects.filter(
+            username=options['username'], is_staff=True
+        ).first()
+        if user is None:
+            raise CommandError('Сотрудник с таким логином не найден')
+        self.stdout.write(make_profile_token(user))
+        self.stderr.write(
+            f'Токен действует {settings.PROFILER_TOKEN_MAX_AGE} с'
+        )
@@ -0,0 +1,61 @@
+"""Скрипт для пересчета денормализованных счетчиков."""
+
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription
+from users.models import User
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+)
+
+
+def count_subquery(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешний объект."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    """Работа с базой данных."""
+
+    help = 'Пересчет счетчиков рецептов, избранного, покупок и подписчиков'
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        for model, counter, source, field in COUNTERS:
+            expected = count_subquery(source, field)
+            with transaction.atomic():
+                drifted = (
+                    model.objects.annotate(expected=expected)
+                    .exclude(**{counter: expected})
+                    .count()
+                )
+                model.objects.update(**{counter: expected})
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{counter}: '
+                f'исправлено {drifted}'
+            )
+        switched = User.objects.filter(
+            feed_fan_in=False,
+            subscribers_count__gt=settings.FEED_FAN_OUT_MAX_FOLLOWERS,
+        ).update(feed_fan_in=True)
+        self.stdout.write(f'Авторов без рассылки в ленты: +{switched}')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны!'))
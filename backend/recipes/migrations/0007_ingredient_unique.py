@@ -0,0 +1,55 @@
+# Generated by Django 4.1.13 on 2026-10-18 03:30
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_rows(model, keeper_id, duplicate_id):
+    """Переносит строки на оставляемый ингредиент, складывая количества."""
+    for row in model.objects.filter(ingredient_id=duplicate_id):
+        owner = 'recipe_id' if hasattr(row, 'recipe_id') else 'user_id'
+        kept = model.objects.filter(
+            ingredient_id=keeper_id, **{owner: getattr(row, owner)}
+        ).first()
+        if kept is None:
+            row.ingredient_id = keeper_id
+            row.save(update_fields=['ingredient'])
+        else:
+            kept.amount += row.amount
+            kept.save(update_fields=['amount'])
+            row.delete()
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    CartIngredientTotal = apps.get_model('recipes', 'CartIngredientTotal')
+    groups = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keeper_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in groups:
+        duplicates = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(pk=group['keeper_id'])
+        for duplicate_id in duplicates.values_list('pk', flat=True):
+            merge_rows(IngredientInRecipe, group['keeper_id'], duplicate_id)
+            merge_rows(CartIngredientTotal, group['keeper_id'], duplicate_id)
+        duplicates.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
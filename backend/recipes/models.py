@@ -1,7 +1,7 @@
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
-from users.models import User
+from users.models import UpdateOnlyFieldsMixin, User
 
 MIN_INGR_AMOUNT = 1
 MIN_COOK_TIME = 1
@@ -66,14 +66,25 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'], name='unique_ingredient'
+            )
+        ]
 
     def __str__(self) -> str:
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class Recipe(UpdateOnlyFieldsMixin, models.Model):
     """Модель рецептов."""
 
+    update_only_fields = (
+        'favorites_count',
+        'in_carts_count',
+        'image_renditions',
+    )
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -91,6 +102,12 @@ class Recipe(models.Model):
         verbose_name='Изображение рецепта',
         help_text='Выберите изображение рецепта',
     )
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
+    )
     text = models.TextField(
         verbose_name='Описание рецепта', help_text='Введите описание рецепта'
     )
@@ -122,11 +139,31 @@ class Recipe(models.Model):
         verbose_name='Дата создания рецепта',
         help_text='Введите дату создания рецепта',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Количество добавлений в избранное',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество добавлений в списки покупок',
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'{self.name} - {self.author}'
@@ -257,6 +294,12 @@ class Subscription(models.Model):
         ordering = ('-created',)
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(
+                fields=('user', '-created'),
+                name='subscription_user_created_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'], name='unique_relationships'
@@ -295,8 +338,82 @@ class ShoppingCart(models.Model):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         ordering = ('-add_date',)
+        indexes = [
+            models.Index(
+                fields=('user', '-add_date', 'recipe'),
+                name='cart_user_add_date_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'], name='unique_shopping_cart'
             )
         ]
+
+
+class FeedItem(models.Model):
+    """Модель ленты рецептов авторов, на которых подписан пользователь."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-pub_date', '-recipe')
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feeditem_user_pub_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_feed_item'
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} - {self.recipe}'
+
+
+class CartIngredientTotal(models.Model):
+    """Модель суммарного количества ингредиента в списке покупок."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_totals',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_totals',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient_total',
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} - {self.ingredient}, {self.amount}'
@@ -0,0 +1,105 @@
+"""Поддержка денормализованных счетчиков рецептов и пользователей."""
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import User
+
+from .cart import remove_from_totals
+from .catalogue import bump_catalogue_version
+from .feed import clear_feed, fill_feeds, update_feed_mode
+from .models import Favorite, Ingredient, Recipe, ShoppingCart, Subscription
+from .storage import release_image
+
+
+def change_counters(model, pks, field, delta):
+    """Атомарно изменяет счетчики объектов на delta выражением F()."""
+    if delta and pks:
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def change_counter(model, pk, field, delta):
+    change_counters(model, [pk], field, delta)
+
+
+def get_delta(signal, created):
+    """Изменение счетчика: +1 при создании, -1 при удалении объекта."""
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_recipes_count(sender, instance, signal, created=False, **kwargs):
+    change_counter(
+        User, instance.author_id, 'recipes_count', get_delta(signal, created)
+    )
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def update_subscribers_count(
+    sender, instance, signal, created=False, **kwargs
+):
+    change_counter(
+        User,
+        instance.author_id,
+        'subscribers_count',
+        get_delta(signal, created),
+    )
+
+
+@receiver(post_save, sender=Subscription)
+def fill_subscriber_feed(sender, instance, created, **kwargs):
+    if created:
+        update_feed_mode(instance.author_id)
+        fill_feeds([(instance.user_id, instance.author_id)])
+
+
+@receiver(post_delete, sender=Subscription)
+def clear_subscriber_feed(sender, instance, **kwargs):
+    # Подписки удаляются и из админки, и каскадом вместе с пользователем
+    clear_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def update_favorites_count(sender, instance, signal, created=False, **kwargs):
+    change_counter(
+        Recipe,
+        instance.recipe_id,
+        'favorites_count',
+        get_delta(signal, created),
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def update_in_carts_count(sender, instance, signal, created=False, **kwargs):
+    change_counter(
+        Recipe,
+        instance.recipe_id,
+        'in_carts_count',
+        get_delta(signal, created),
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def update_catalogue_version(sender, **kwargs):
+    # До фиксации другой процесс собрал бы старые строки под новой версией
+    transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_totals(sender, instance, **kwargs):
+    remove_from_totals([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    name, renditions = instance.image.name, instance.image_renditions
+    transaction.on_commit(lambda: release_image(name, renditions))
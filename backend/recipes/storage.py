@@ -0,0 +1,307 @@
+"""Хранилища медиафайлов с именами по содержимому."""
+
+import hashlib
+import mimetypes
+import os
+import posixpath
+import tempfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import (FileSystemStorage, Storage,
+                                       default_storage)
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore import UNSIGNED
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+HASH_CHUNK_SIZE = 64 * 1024
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class ContentHashMixin:
+    """Сохраняет файл под именем из sha256 его содержимого.
+
+    Одинаковые файлы хранятся один раз, а содержимое файла по имени
+    никогда не меняется, поэтому его можно кэшировать бессрочно.
+    Повторное сохранение существующего файла обновляет время его
+    изменения: release_image и cleanup_media не удаляют недавно
+    сохраненные файлы, ссылка на которые еще не зафиксирована.
+    """
+
+    def get_hashed_name(self, name, content):
+        sha256 = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+        content.seek(0)
+        directory, basename = posixpath.split(name)
+        extension = posixpath.splitext(basename)[1].lower()
+        return posixpath.join(directory, f'{sha256.hexdigest()}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        if self.exists(name) and self.touch(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def touch(self, name):
+        """Обновляет время изменения файла; False, если файла уже нет."""
+        raise NotImplementedError
+
+    def copy(self, name, content):
+        """Записывает файл под прежним именем, например при переносе."""
+        if not self.exists(name):
+            self._save(name, content)
+        return name
+
+
+class ContentHashStorage(ContentHashMixin, FileSystemStorage):
+    """Локальное хранилище в MEDIA_ROOT."""
+
+    def touch(self, name):
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+
+@deconstructible
+class S3ContentHashStorage(ContentHashMixin, Storage):
+    """Хранилище в S3-совместимом сервисе (AWS S3, MinIO).
+
+    Большие файлы загружаются составной загрузкой в несколько потоков.
+    Ссылки на файлы ведут прямо в хранилище, поэтому приложение само
+    изображения не отдает. По умолчанию ссылки постоянные (публичный
+    бакет или AWS_S3_CUSTOM_DOMAIN) и кэшируются бессрочно; подписанные
+    на время ссылки для закрытого бакета включает AWS_QUERYSTRING_AUTH.
+    """
+
+    def __init__(self, bucket_name=None, location=None):
+        if boto3 is None:
+            raise ImproperlyConfigured(
+                'Для хранения медиафайлов в S3 установите boto3'
+            )
+        self.bucket_name = bucket_name or settings.AWS_STORAGE_BUCKET_NAME
+        self.location = (
+            settings.AWS_LOCATION if location is None else location
+        ).strip('/')
+        self.client = boto3.client(
+            's3',
+            endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+            region_name=settings.AWS_S3_REGION_NAME,
+            config=Config(
+                signature_version='s3v4',
+                max_pool_connections=settings.AWS_S3_MAX_CONCURRENCY * 2,
+            ),
+        )
+        # Строит постоянные ссылки без подписи с учетом адреса хранилища
+        self.url_client = boto3.client(
+            's3',
+            endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+            region_name=settings.AWS_S3_REGION_NAME,
+            config=Config(signature_version=UNSIGNED),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.AWS_S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.AWS_S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=settings.AWS_S3_MAX_CONCURRENCY,
+        )
+
+    def get_key(self, name):
+        name = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+        if self.location:
+            return f'{self.location}/{name}'
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Имена по содержимому не конфликтуют, перезапись безопасна.
+        return name
+
+    def _open(self, name, mode='rb'):
+        output = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        self.client.download_fileobj(
+            self.bucket_name,
+            self.get_key(name),
+            output,
+            Config=self.transfer_config,
+        )
+        output.seek(0)
+        return File(output, name)
+
+    def _save(self, name, content):
+        content_type = (
+            getattr(content, 'content_type', None)
+            or mimetypes.guess_type(name)[0]
+            or 'application/octet-stream'
+        )
+        content.seek(0)
+        self.client.upload_fileobj(
+            content,
+            self.bucket_name,
+            self.get_key(name),
+            ExtraArgs={
+                'ContentType': content_type,
+                'CacheControl': CACHE_CONTROL,
+            },
+            Config=self.transfer_config,
+        )
+        return name
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(
+                Bucket=self.bucket_name, Key=self.get_key(name)
+            )
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return None
+            raise
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def touch(self, name):
+        # LastModified меняется только при записи: копия объекта в себя
+        head = self._head(name)
+        if head is None:
+            return False
+        key = self.get_key(name)
+        try:
+            self.client.copy_object(
+                Bucket=self.bucket_name,
+                Key=key,
+                CopySource={'Bucket': self.bucket_name, 'Key': key},
+                MetadataDirective='REPLACE',
+                ContentType=head['ContentType'],
+                CacheControl=CACHE_CONTROL,
+            )
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+        return True
+
+    def delete(self, name):
+        self.client.delete_object(
+            Bucket=self.bucket_name, Key=self.get_key(name)
+        )
+
+    def _head_existing(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head
+
+    def size(self, name):
+        return self._head_existing(name)['ContentLength']
+
+    def get_modified_time(self, name):
+        return self._head_existing(name)['LastModified']
+
+    def listdir(self, path):
+        path = posixpath.normpath(path).strip('/')
+        if path == '.':
+            prefix = f'{self.location}/' if self.location else ''
+        else:
+            prefix = f'{self.get_key(path)}/'
+        directories, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            Bucket=self.bucket_name, Prefix=prefix, Delimiter='/'
+        )
+        for page in pages:
+            for item in page.get('CommonPrefixes', ()):
+                directories.append(item['Prefix'][len(prefix):].rstrip('/'))
+            for item in page.get('Contents', ()):
+                files.append(item['Key'][len(prefix):])
+        return directories, files
+
+    def url(self, name):
+        key = self.get_key(name)
+        if settings.AWS_S3_CUSTOM_DOMAIN:
+            return f'{settings.AWS_S3_CUSTOM_DOMAIN.rstrip("/")}/{quote(key)}'
+        if settings.AWS_QUERYSTRING_AUTH:
+            return self.client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket_name, 'Key': key},
+                ExpiresIn=settings.AWS_QUERYSTRING_EXPIRE,
+            )
+        return self.url_client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket_name, 'Key': key}
+        )
+
+
+def walk_files(storage, path):
+    """Пути всех файлов хранилища внутри каталога."""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk_files(storage, posixpath.join(path, directory))
+
+
+def get_referenced_files():
+    """Все пути файлов, на которые ссылаются рецепты и их копии."""
+    from .models import Recipe
+
+    referenced = set()
+    recipes = Recipe.objects.values_list('image', 'image_renditions')
+    for image, renditions in recipes.iterator(chunk_size=2000):
+        if image:
+            referenced.add(image)
+        referenced.update(get_rendition_files(renditions))
+    return referenced
+
+
+def get_local_storage():
+    """Локальное хранилище MEDIA_ROOT, из которого переносятся файлы."""
+    return ContentHashStorage(location=os.fspath(settings.MEDIA_ROOT))
+
+
+def get_rendition_files(renditions):
+    """Пути файлов уменьшенных копий из Recipe.image_renditions."""
+    return [name for files in renditions.values() for name in files.values()]
+
+
+def release_image(name, renditions):
+    """Удаляет изображение и его копии, если на него не ссылаются рецепты.
+
+    Копии строятся по содержимому изображения, поэтому рецепты с тем же
+    изображением ссылаются на те же копии и удерживают их вместе с ним.
+    Файл, сохраненный недавно, мог только что получить рецепт в еще не
+    зафиксированной транзакции, поэтому он остается; если ссылка так и
+    не появилась, его удалит cleanup_media.
+    """
+    from .models import Recipe
+
+    if not name or Recipe.objects.filter(image=name).exists():
+        return
+    try:
+        modified = default_storage.get_modified_time(name)
+    except FileNotFoundError:
+        modified = None
+    if modified is not None:
+        age = (timezone.now() - modified).total_seconds()
+        if age < settings.MEDIA_RELEASE_GRACE_SECONDS:
+            return
+    if Recipe.objects.filter(image=name).exists():
+        return
+    for file_name in [name, *get_rendition_files(renditions)]:
+        default_storage.delete(file_name)
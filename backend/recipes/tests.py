@@ -0,0 +1,356 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from users.models import User
+
+from . import catalogue
+from .feed import fill_feeds, get_feed
+from .models import Favorite, FeedItem, Recipe, ShoppingCart, Subscription
+from .storage import ContentHashStorage, S3ContentHashStorage
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+
+class CounterSaveTest(TestCase):
+    """save() загруженной раньше строки не затирает счетчики."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = [
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for username in ('author', 'reader')
+        ]
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='Рецепт',
+            image='recipes/image.png',
+            text='Описание',
+            cooking_time=5,
+        )
+
+    def test_recipe_save_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image_renditions={'320': {'jpeg': 'recipes/320.jpeg'}}
+        )
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.in_carts_count, 1)
+        self.assertEqual(
+            recipe.image_renditions, {'320': {'jpeg': 'recipes/320.jpeg'}}
+        )
+
+    def test_user_save_keeps_counters(self):
+        author = User.objects.get(pk=self.author.pk)
+        Subscription.objects.create(user=self.reader, author=self.author)
+        Recipe.objects.create(
+            author=self.author,
+            name='Второй рецепт',
+            image='recipes/image.png',
+            text='Описание',
+            cooking_time=5,
+        )
+        author.set_password('new-password')
+        author.save()
+        author.refresh_from_db()
+        self.assertTrue(author.check_password('new-password'))
+        self.assertEqual(author.subscribers_count, 1)
+        self.assertEqual(author.recipes_count, 2)
+
+
+@override_settings(FEED_FAN_OUT_MAX_FOLLOWERS=1, FEED_BACKFILL_SIZE=2)
+class FeedTest(TestCase):
+    """Лента подписок при смене режима автора и удалении подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.first, cls.second = [
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for username in ('author', 'first', 'second')
+        ]
+
+    def create_recipe(self, author=None):
+        return Recipe.objects.create(
+            author=author or self.author,
+            name='Рецепт',
+            image='recipes/image.png',
+            text='Описание',
+            cooking_time=5,
+        )
+
+    def feed(self, user):
+        return set(
+            get_feed(user, Recipe.objects.all()).values_list('pk', flat=True)
+        )
+
+    def test_fan_in_recipes_stay_after_unsubscribe(self):
+        Subscription.objects.create(user=self.first, author=self.author)
+        Subscription.objects.create(user=self.second, author=self.author)
+        self.author.refresh_from_db()
+        self.assertTrue(self.author.feed_fan_in)
+        recipe = self.create_recipe()
+        Subscription.objects.filter(user=self.second).delete()
+        self.assertEqual(self.feed(self.first), {recipe.pk})
+
+    def test_delete_clears_feed(self):
+        subscription = Subscription.objects.create(
+            user=self.first, author=self.author
+        )
+        FeedItem.objects.create(
+            user=self.first,
+            recipe=self.create_recipe(),
+            pub_date=self.author.date_joined,
+        )
+        subscription.delete()
+        self.assertFalse(FeedItem.objects.filter(user=self.first).exists())
+
+    def test_fill_feeds_queries_do_not_grow(self):
+        recipes = [self.create_recipe() for _ in range(3)]
+        other_recipe = self.create_recipe(self.second)
+        with CaptureQueriesContext(connection) as queries:
+            fill_feeds(
+                [
+                    (self.first.pk, self.author.pk),
+                    (self.first.pk, self.second.pk),
+                ]
+            )
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertEqual(
+            set(
+                FeedItem.objects.filter(user=self.first).values_list(
+                    'recipe', flat=True
+                )
+            ),
+            {recipes[2].pk, recipes[1].pk, other_recipe.pk},
+        )
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    },
+    CATALOGUE_VERSION_CHECK_SECONDS=60,
+)
+class CatalogueVersionTest(SimpleTestCase):
+    """Версия справочника перечитывается из кэша не на каждый запрос."""
+
+    def setUp(self):
+        cache.clear()
+        catalogue._checked = (None, 0.0)
+        self.addCleanup(setattr, catalogue, '_checked', (None, 0.0))
+
+    def test_version_is_checked_periodically(self):
+        version = catalogue.get_catalogue_version()
+        cache.set(catalogue.VERSION_KEY, 'other')
+        with mock.patch.object(cache, 'get') as cache_get:
+            self.assertEqual(catalogue.get_catalogue_version(), version)
+        cache_get.assert_not_called()
+        with self.settings(CATALOGUE_VERSION_CHECK_SECONDS=0):
+            self.assertEqual(catalogue.get_catalogue_version(), 'other')
+
+    def test_bump_is_seen_at_once(self):
+        catalogue.get_catalogue_version()
+        version = catalogue.bump_catalogue_version()
+        self.assertEqual(catalogue.get_catalogue_version(), version)
+
+
+class ReleaseImageTest(TestCase):
+    """Удаление изображения рецепта вместе с уменьшенными копиями."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = self.settings(
+            MEDIA_ROOT=media_root, MEDIA_RELEASE_GRACE_SECONDS=0
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        self.image = default_storage.save(
+            'recipes/image.png', ContentFile(b'image')
+        )
+        self.renditions = {
+            '320': {
+                file_format: default_storage.save(
+                    f'recipes/renditions/320.{file_format}',
+                    ContentFile(file_format.encode()),
+                )
+                for file_format in ('webp', 'jpeg')
+            }
+        }
+
+    def create_recipe(self):
+        return Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            image=self.image,
+            image_renditions=self.renditions,
+            text='Описание',
+            cooking_time=5,
+        )
+
+    def get_files(self):
+        return [self.image, *self.renditions['320'].values()]
+
+    def test_delete_releases_renditions(self):
+        recipe = self.create_recipe()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        for name in self.get_files():
+            self.assertFalse(default_storage.exists(name), name)
+
+    def test_shared_image_is_kept(self):
+        recipe = self.create_recipe()
+        self.create_recipe()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        for name in self.get_files():
+            self.assertTrue(default_storage.exists(name), name)
+
+
+@skipUnless(mock_aws, 'Для тестов хранилища S3 установите moto')
+@override_settings(
+    AWS_STORAGE_BUCKET_NAME='foodgram',
+    AWS_LOCATION='media',
+    AWS_S3_ENDPOINT_URL=None,
+    AWS_S3_REGION_NAME='us-east-1',
+    AWS_S3_CUSTOM_DOMAIN=None,
+    AWS_QUERYSTRING_AUTH=False,
+)
+class S3ContentHashStorageTest(TestCase):
+    """Хранилище S3 на бакете moto."""
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(
+                os.environ,
+                AWS_ACCESS_KEY_ID='testing',
+                AWS_SECRET_ACCESS_KEY='testing',
+            ),
+            mock_aws(),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket='foodgram')
+        self.storage = S3ContentHashStorage()
+
+    def get_keys(self):
+        response = self.s3.list_objects_v2(Bucket='foodgram')
+        return [item['Key'] for item in response.get('Contents', ())]
+
+    def test_save_deduplicates_by_content(self):
+        name = self.storage.save('recipes/first.PNG', ContentFile(b'image'))
+        self.assertRegex(name, r'^recipes/[0-9a-f]{64}\.png$')
+        self.assertEqual(
+            self.storage.save('recipes/second.png', ContentFile(b'image')),
+            name,
+        )
+        other = self.storage.save('recipes/other.png', ContentFile(b'other'))
+        self.assertNotEqual(other, name)
+        self.assertEqual(
+            sorted(self.get_keys()),
+            sorted([f'media/{name}', f'media/{other}']),
+        )
+        head = self.s3.head_object(Bucket='foodgram', Key=f'media/{name}')
+        self.assertEqual(head['ContentType'], 'image/png')
+        self.assertIn('immutable', head['CacheControl'])
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'image')
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), 5)
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(self.storage.touch(name))
+
+    def test_url(self):
+        url = self.storage.url('recipes/image.png')
+        self.assertIn('/media/recipes/image.png', url)
+        self.assertNotIn('Signature', url)
+        with self.settings(AWS_QUERYSTRING_AUTH=True):
+            self.assertIn('Signature', self.storage.url('recipes/image.png'))
+        with self.settings(AWS_S3_CUSTOM_DOMAIN='https://cdn.example.com/'):
+            self.assertEqual(
+                self.storage.url('recipes/image.png'),
+                'https://cdn.example.com/media/recipes/image.png',
+            )
+
+    def test_move_media(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with self.settings(MEDIA_ROOT=media_root):
+            local = ContentHashStorage(location=media_root)
+            image = local.save('recipes/image.png', ContentFile(b'image'))
+            rendition = local.save(
+                'recipes/renditions/image.webp', ContentFile(b'webp')
+            )
+            unused = local.save('recipes/unused.png', ContentFile(b'unused'))
+            Recipe.objects.create(
+                author=User.objects.create_user(
+                    username='author',
+                    email='author@example.com',
+                    password='password',
+                    first_name='Имя',
+                    last_name='Фамилия',
+                ),
+                name='Рецепт',
+                image=image,
+                image_renditions={'320': {'webp': rendition}},
+                text='Описание',
+                cooking_time=5,
+            )
+            with self.settings(
+                DEFAULT_FILE_STORAGE='recipes.storage.S3ContentHashStorage'
+            ):
+                for _ in range(2):
+                    call_command(
+                        'move_media', delete=True, stdout=io.StringIO()
+                    )
+                self.assertTrue(default_storage.exists(image))
+            self.assertEqual(
+                sorted(self.get_keys()),
+                sorted([f'media/{image}', f'media/{rendition}']),
+            )
+            self.assertFalse(local.exists(image))
+            self.assertFalse(local.exists(rendition))
+            self.assertTrue(local.exists(unused))
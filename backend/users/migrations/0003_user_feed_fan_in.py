@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_fan_in_authors(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.filter(
+        subscribers_count__gt=settings.FEED_FAN_OUT_MAX_FOLLOWERS
+    ).update(feed_fan_in=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_fan_in',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Рецепты подмешиваются в ленту при чтении'),
+        ),
+        migrations.RunPython(mark_fan_in_authors, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,34 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class User(AbstractUser):
+class UpdateOnlyFieldsMixin:
+    """Не перезаписывает при save() поля, которые меняют только UPDATE.
+
+    Счетчики изменяются выражениями F() из сигналов: полная запись
+    строки вернула бы прочитанные раньше значения и затерла бы
+    параллельные изменения. Поля из update_only_fields записываются
+    только при создании строки или явно через update_fields.
+    """
+
+    update_only_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not self._state.adding
+        ):
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.update_only_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(UpdateOnlyFieldsMixin, AbstractUser):
     """Модель пользователя."""
 
     username = models.CharField(
@@ -30,6 +57,22 @@ class User(AbstractUser):
         verbose_name='Подписка на данного автора',
         help_text='Отметьте для подписки на автора',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество рецептов'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество подписчиков'
+    )
+    feed_fan_in = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Рецепты подмешиваются в ленту при чтении',
+    )
+    update_only_fields = (
+        'recipes_count',
+        'subscribers_count',
+        'feed_fan_in',
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'password']
 